@@ -1,10 +1,5 @@
 from flask import Flask  # Flask framework to create the application
-from flask_cors import CORS
 from backend.config import Config  # Configuration settings (database, secret keys, etc.)
-from backend.extensions import db, migrate, bcrypt, cors  # Extensions for database, migrations, security, and CORS
-from backend.auth_routes import auth  # Import authentication-related routes
-from backend.routes import main  # Import general routes (home page, etc.)
-from backend.user_comparison import comparison  #Import user comparison routes
 
 def create_app():
     """
@@ -12,23 +7,63 @@ def create_app():
     - Creates and configures the Flask app instance
     - Initializes extensions (DB, migrations, security, CORS)
     - Registers Blueprints (modular routes)
+
+    Extensions and blueprints are imported here rather than at module level, so importing a
+    single backend module (config, genre_taxonomy, a benchmark helper) doesn't load the whole app.
     """
-    
+    from backend.extensions import db, migrate, bcrypt, cors  # Extensions for database, migrations, security, and CORS
+    from backend.database import normalize_database_uri, engine_options, sqlite_pragmas, apply_sqlite_pragmas
+    from backend.instrumentation import init_instrumentation, instrument_engine  # Latency histograms, /metrics, sampled profiling
+    from backend.serialization import FastJSONProvider  # orjson/msgspec-backed jsonify when installed
+    from backend.http_cache import init_http_cache  # gzip/brotli responses, encoding-aware ETags
+    from backend.genre_taxonomy import init_taxonomy_reload, taxonomy_cli  # Lazily loaded, hot-reloaded genre taxonomy
+    from backend.auth_routes import auth  # Import authentication-related routes
+    from backend.routes import main  # Import general routes (home page, etc.)
+    from backend.user_comparison import comparison  #Import user comparison routes
+    from backend.sync_worker import sync_cli  # `flask sync ...` background re-sync commands
+    from backend.library_import import library_cli  # `flask library import ...` full library import
+
     #  Initialize Flask app
     app = Flask(__name__)
     app.config.from_object(Config)  #  Load configuration settings
+    app.json = FastJSONProvider(app)  # jsonify through the fastest available JSON backend
+    app.config["SQLALCHEMY_DATABASE_URI"] = normalize_database_uri(app.config["SQLALCHEMY_DATABASE_URI"])
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)  # Pool sizing per database backend
 
     #  Add this line to support cross-origin requests with cookies
     cors.init_app(app, supports_credentials=True, origins=["http://localhost:3000"])
     #  Initialize Flask extensions
     db.init_app(app)  # Initialize the database (SQLAlchemy)
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine, sqlite_pragmas(app.config))  # WAL, synchronous, busy timeout, mmap
+        instrument_engine(db.engine)  # Per-statement query latency
     migrate.init_app(app, db)  # Enable database migrations (Flask-Migrate)
     bcrypt.init_app(app)  # Initialize Bcrypt for password hashing
     cors.init_app(app)  # Enable Cross-Origin Resource Sharing (CORS)
+    init_http_cache(app)  # Compress large responses and match ETags of compressed bodies
+    init_instrumentation(app)  # Per-route latency and status counters, exposed at /metrics
+    init_taxonomy_reload(app)  # Pick up edits to the taxonomy JSON without a restart
 
     # Register Blueprints (modular route handlers)
     app.register_blueprint(auth)  # Authentication routes (e.g., /login, /callback, /logout)
     app.register_blueprint(main)  # General routes (e.g., home page /)
     app.register_blueprint(comparison)  # Register the user comparison routes
 
+    app.cli.add_command(sync_cli)  # Background taste-sync worker
+    app.cli.add_command(library_cli)  # Paginated library import
+    app.cli.add_command(taxonomy_cli)  # `flask taxonomy build`
+
+    @app.cli.command("init-db")
+    def init_db():
+        """
+        Bootstrap a new database: create all tables from the models, then stamp the migration
+        head so later `flask db upgrade` runs apply only newer migrations. (The migration chain
+        starts from an existing user table, so it can't build a database from nothing.)
+        """
+        from flask_migrate import stamp
+
+        db.create_all()
+        stamp()
+        print("Database tables created and stamped at the migration head")
+
     return app  # Return the Flask app instance
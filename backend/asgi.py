@@ -0,0 +1,147 @@
+"""
+ASGI entry point: the same app as backend/wsgi.py, with the /async Spotify routes on an event loop.
+
+    gunicorn -c gunicorn.conf.py -k asgi backend.asgi:app
+
+The Flask app comes from backend.wsgi (create_app config, warm-up, preload), so both entry
+points serve identical routes. Requests for the /async routes (backend/async_routes.py) run as
+coroutines on the worker's event loop inside a regular Flask request context, so hooks, sessions,
+compression and /metrics apply as usual; while one waits on Spotify it holds no thread, and one
+worker can keep hundreds of upstream calls in flight (SPOTIFY_ASYNC_MAX_CONCURRENCY). Every other
+path is handed to the Flask WSGI app in the worker's thread pool (ASGI_SYNC_THREADS), which the
+async routes also use for database work.
+"""
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Map, Rule
+
+from backend.async_routes import routes
+from backend.async_spotify import async_spotify
+from backend.extensions import db
+from backend.wsgi import app as flask_app
+
+
+def build_environ(scope, body):
+    """A WSGI environ for an ASGI HTTP scope whose request body was read into `body` (a file)."""
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("ascii"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "SERVER_NAME": scope["server"][0] if scope.get("server") else "localhost",
+        "SERVER_PORT": str(scope["server"][1]) if scope.get("server") else "80",
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1").upper().replace("-", "_")
+        if name not in ("CONTENT_LENGTH", "CONTENT_TYPE"):
+            name = f"HTTP_{name}"
+        value = value.decode("latin1")
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def run_wsgi(wsgi_app, environ):
+    """Call a WSGI app (or response object); returns (status, headers, body)."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = int(status.split(" ", 1)[0]), headers
+
+    result = wsgi_app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started["status"], started["headers"], body
+
+
+class AsyncRoutesApp:
+    """ASGI app: `routes` are awaited on the event loop, everything else goes to `flask_app`."""
+
+    def __init__(self, flask_app, routes, sync_threads):
+        self.flask_app = flask_app
+        self.routes = routes
+        self.url_map = Map([Rule(path, endpoint=path, methods=["GET"]) for path in routes])
+        self.sync_threads = sync_threads
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        environ = build_environ(scope, await self.read_body(receive))
+        try:
+            rule, _ = self.url_map.bind_to_environ(environ).match(return_rule=True)
+        except HTTPException:  # Not an async route (or not a GET): Flask answers, 404/405 included
+            status, headers, body = await asyncio.to_thread(run_wsgi, self.flask_app, environ)
+        else:
+            status, headers, body = await self.dispatch(rule, environ)
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def dispatch(self, rule, environ):
+        """Flask's full_dispatch_request, with the view awaited instead of called."""
+        app = self.flask_app
+        with app.request_context(environ) as ctx:
+            ctx.request.url_rule, ctx.request.routing_exception = rule, None
+            try:
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await self.routes[rule.endpoint]()
+                except Exception as error:
+                    rv = app.handle_user_exception(error)
+                response = app.finalize_request(rv)
+            except Exception as error:
+                response = app.handle_exception(error)
+            finally:
+                # Hand the connection back from a pool thread; the context teardown then has nothing to do
+                await asyncio.to_thread(db.session.remove)
+            return run_wsgi(response, environ)
+
+    @staticmethod
+    async def read_body(receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break  # http.disconnect
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        return BytesIO(b"".join(chunks))
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                loop = asyncio.get_running_loop()
+                loop.set_default_executor(ThreadPoolExecutor(self.sync_threads, thread_name_prefix="asgi-sync"))
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await async_spotify.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+app = AsyncRoutesApp(flask_app, routes, flask_app.config["ASGI_SYNC_THREADS"])
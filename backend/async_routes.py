@@ -0,0 +1,182 @@
+import asyncio
+
+import httpx
+import requests
+from flask import jsonify, request
+
+from backend.async_spotify import async_spotify
+from backend.auth_routes import (
+    SNAPSHOT_PARAMS,
+    cached_payload,
+    cacheable_response,
+    login_redirect,
+    parse_taste_snapshot,
+    payload_from_response,
+    requested_time_range,
+    save_login,
+    serve_snapshot,
+    snapshot_json,
+)
+from backend.config import Config
+from backend.extensions import db
+from backend.serialization import RawJSON
+from backend.token_manager import token_manager, TokenRefreshError
+from backend.user_loader import load_user
+
+# Async versions of the Spotify-backed `auth` routes, served under /async by the ASGI app
+# (backend/asgi.py) on the worker's event loop: a request waiting on Spotify holds a coroutine,
+# not a thread. There is no async database driver here, so database work, token refreshes and
+# the shared cache/write-back helpers run in the worker's thread pool via `run_sync`.
+
+
+async def run_sync(function, *args):
+    """Run blocking `function(*args)` in the thread pool, inside this request's Flask context."""
+    return await asyncio.to_thread(release_after, function, args)
+
+
+def release_after(function, args):
+    """
+    Call `function(*args)`, then end the transaction it opened. Otherwise the connection would
+    stay checked out while the coroutine awaits Spotify, and a few hundred in-flight requests
+    would starve the pool. Loaded rows stay usable: this request's session doesn't expire on commit.
+    """
+    session = db.session()
+    session.expire_on_commit = False
+    try:
+        result = function(*args)
+    except BaseException:
+        session.rollback()
+        raise
+    session.commit()
+    return result
+
+
+async def callback():
+    """Same as /callback; point SPOTIFY_REDIRECT_URI at /async/callback to use it."""
+    code = request.args.get("code")
+    if not code:
+        return jsonify({"error": "Authorization failed"}), 400
+
+    try:
+        response = await async_spotify.request_token(
+            "authorization_code", code=code, redirect_uri=Config.SPOTIFY_REDIRECT_URI
+        )
+        token_info = response.json()
+    except (httpx.HTTPError, ValueError):
+        return jsonify({"error": "Failed to retrieve access token from Spotify"}), 400
+
+    if "access_token" not in token_info:
+        return jsonify({"error": "Failed to retrieve access token"}), 400
+
+    access_token = token_info["access_token"]
+    try:
+        user_response, artists_response, tracks_response = await asyncio.gather(
+            async_spotify.get("me", access_token),
+            async_spotify.get("me/top/artists", access_token, SNAPSHOT_PARAMS),
+            async_spotify.get("me/top/tracks", access_token, SNAPSHOT_PARAMS),
+        )
+        user_data = snapshot_json(user_response)
+        top_artists, top_genres, top_tracks = parse_taste_snapshot(artists_response, tracks_response)
+    except (httpx.HTTPError, requests.exceptions.RequestException):
+        return jsonify({"error": "Failed to fetch profile data from Spotify"}), 502
+
+    spotify_id = user_data.get("id")
+    if not spotify_id:
+        return jsonify({"error": "Spotify ID not found"}), 400
+
+    await run_sync(save_login, spotify_id, token_info, top_artists, top_tracks, top_genres)
+    return login_redirect(spotify_id)
+
+
+async def top_artists():
+    user, error = await find_user()
+    if error:
+        return error
+    snapshot = await run_sync(serve_snapshot, user, lambda u: RawJSON('{"items":' + (u.top_artists or "[]") + "}"))
+    return snapshot or await fetch_spotify_data("me/top/artists", user)
+
+
+async def top_tracks():
+    user, error = await find_user()
+    if error:
+        return error
+    snapshot = await run_sync(serve_snapshot, user, lambda u: RawJSON('{"items":' + (u.top_tracks or "[]") + "}"))
+    return snapshot or await fetch_spotify_data("me/top/tracks", user)
+
+
+async def top_genres():
+    user, error = await find_user()
+    if error:
+        return error
+
+    snapshot = await run_sync(serve_snapshot, user, lambda u: {"top_genres": u.genre_names()})
+    if snapshot:
+        return snapshot
+
+    artist_data, error = await get_spotify_payload("me/top/artists", user, requested_time_range())
+    if error:
+        return error
+
+    genre_list = []
+    for artist in artist_data.get("items", []):
+        genre_list.extend(artist.get("genres", []))
+
+    return cacheable_response({"top_genres": list(dict.fromkeys(genre_list))})
+
+
+async def full_top_artists():
+    user, error = await find_user()
+    if error:
+        return error
+
+    data, error = await get_spotify_payload("me/top/artists", user, "short_term")
+    if error:
+        return jsonify({"error": "Failed to fetch top artists from Spotify"}), error[1]
+
+    return cacheable_response(data)
+
+
+# Path -> view, dispatched by backend.asgi (GET only, like their `auth` counterparts)
+routes = {
+    "/async/callback": callback,
+    "/async/top-artists": top_artists,
+    "/async/top-tracks": top_tracks,
+    "/async/top-genres": top_genres,
+    "/async/full-top-artists": full_top_artists,
+}
+
+
+async def find_user():
+    spotify_id = request.args.get("spotify_id")
+    if not spotify_id:
+        return None, (jsonify({"error": "Missing spotify_id"}), 400)
+    user = await run_sync(load_user, spotify_id)
+    if not user:
+        return None, (jsonify({"error": "User not found"}), 404)
+    return user, None
+
+
+async def get_spotify_payload(endpoint, user, time_range=None, params=None):
+    """`auth_routes.get_spotify_payload` with the upstream call awaited; same cache and write-back helpers."""
+    data, error, call = await run_sync(cached_payload, endpoint, user, time_range, params)
+    if call is None:
+        return data, error
+
+    try:
+        access_token = await run_sync(token_manager.access_token, user)
+    except TokenRefreshError as error:
+        return None, (jsonify({"error": str(error)}), 401)
+
+    try:
+        response = await async_spotify.get(endpoint, access_token, call["params"], call["headers"])
+    except httpx.HTTPError:
+        return None, (jsonify({"error": f"Failed to fetch {endpoint}"}), 502)
+
+    return await run_sync(payload_from_response, endpoint, user, call, response)
+
+
+async def fetch_spotify_data(endpoint, user):
+    data, error = await get_spotify_payload(endpoint, user, requested_time_range())
+    if error:
+        return error
+    return cacheable_response(data)
@@ -0,0 +1,91 @@
+import asyncio
+import time
+import weakref
+
+import httpx
+
+from backend.config import Config
+from backend.spotify_client import RETRY_STATUSES, spotify
+
+
+class AsyncSpotifyClient:
+    """
+    Non-blocking counterpart of `SpotifyClient` for the ASGI routes (see backend/asgi.py).
+
+    - one long-lived `httpx.AsyncClient` per event loop (an AsyncClient is bound to the loop
+      that first uses it), created on first use and closed by the ASGI lifespan shutdown
+    - an `asyncio.Semaphore` per loop bounding in-flight calls, the event-loop counterpart of
+      SpotifyClient's thread semaphore; the connection pool is sized to match
+    - endpoints, credentials, timeouts, retry policy (`retry_delay`) and metrics are the sync
+      client's, so /metrics counts calls from both
+    """
+
+    def __init__(self, client, max_concurrency=256):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._loops = weakref.WeakKeyDictionary()  # event loop -> (AsyncClient, Semaphore)
+
+    @classmethod
+    def from_config(cls, client, config):
+        return cls(client, max_concurrency=config.SPOTIFY_ASYNC_MAX_CONCURRENCY)
+
+    async def get(self, path, access_token, params=None, headers=None):
+        """GET a Web API path (e.g. 'me/top/artists') as the given user."""
+        all_headers = {"Authorization": f"Bearer {access_token}", **(headers or {})}
+        return await self._request("GET", path.split("?", 1)[0], f"{self.client.api_base_url}{path}",
+                                   params=params, headers=all_headers)
+
+    async def request_token(self, grant_type, **fields):
+        """POST to the accounts token endpoint (authorization_code or refresh_token grants)."""
+        data, max_retries = self.client.token_request_data(grant_type, **fields)
+        return await self._request("POST", "token", self.client.token_url, max_retries=max_retries, data=data)
+
+    async def aclose(self):
+        """Close the running loop's connection pool (ASGI lifespan shutdown)."""
+        state = self._loops.pop(asyncio.get_running_loop(), None)
+        if state:
+            await state[0].aclose()
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            connect, read = self.client.timeout
+            http = httpx.AsyncClient(
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+            state = self._loops[loop] = (http, asyncio.Semaphore(self.max_concurrency))
+        return state
+
+    async def _request(self, method, endpoint, url, max_retries=None, **kwargs):
+        http, slots = self._state()
+        max_retries = self.client.max_retries if max_retries is None else max_retries
+        max_backoff = self.client.request_max_backoff  # An HTTP request is always waiting on these calls
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                async with slots:
+                    response = await http.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                self.client.record_call(endpoint, time.perf_counter() - started, error=True)
+                delay = self.client.retry_delay(attempt, max_retries, max_backoff)
+                if delay is None:
+                    raise
+            else:
+                self.client.record_call(endpoint, time.perf_counter() - started, error=response.status_code >= 400)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = self.client.retry_delay(attempt, max_retries, max_backoff, response)
+                if delay is None:
+                    return response
+
+            attempt += 1
+            self.client.record_retry(endpoint)
+            await asyncio.sleep(delay)
+
+
+# Shared by the async routes; wraps the same configuration and metrics as `spotify`
+async_spotify = AsyncSpotifyClient.from_config(spotify, Config)
@@ -3,18 +3,33 @@ from datetime import datetime, timedelta
 from urllib.parse import urlencode
 from flask import Blueprint, redirect, request, session, jsonify
 from backend.config import Config
-from backend.models import db, User
-import json
-from flask import make_response
+from backend.models import db, User, profile_write_stats
+from backend.user_comparison import refresh_user_in_index, comparison_cache
+from backend.listening_history import history_page, poll_due, poll_new_plays
+from backend.spotify_client import spotify
+from backend.response_cache import build_response_cache
+from backend.token_manager import token_manager, TokenRefreshError
+from backend.sync_queue import enqueue_sync
+from backend.user_loader import load_user, remember_user, hot_users
+from backend.instrumentation import metrics, record_error
+from backend.serialization import RawJSON, artist_record, loads, track_record, trim_payload
+from flask import current_app, make_response
 
 
 auth = Blueprint("auth", __name__)
 
 SPOTIFY_AUTH_URL = "https://accounts.spotify.com/authorize"
-SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
-SPOTIFY_API_BASE_URL = "https://api.spotify.com/v1/"
 SCOPE = "user-read-recently-played user-top-read user-library-read user-read-private"
 FRONTEND_REDIRECT_URI = "http://127.0.0.1:3000/dashboard"
+TIME_RANGES = {"short_term", "medium_term", "long_term"}
+SNAPSHOT_PARAMS = {"limit": 10, "time_range": "short_term"}  # What callback and the sync worker store per user
+
+response_cache = build_response_cache(Config)
+
+metrics.register_stats("response_cache", "Spotify response cache counters.", response_cache.stats)
+metrics.register_stats("token_refresh", "Token refresh counters.", token_manager.stats)
+metrics.register_stats("profile_writes", "Profile field writes applied or skipped as unchanged.", profile_write_stats)
+metrics.register_stats("user_cache", "Hot user cache counters.", hot_users.stats)
 
 @auth.route("/login")
 def login():
@@ -40,84 +55,70 @@ def callback():
     if not code:
         return jsonify({"error": "Authorization failed"}), 400
 
-    token_data = {
-        "grant_type": "authorization_code",
-        "code": code,
-        "redirect_uri": Config.SPOTIFY_REDIRECT_URI,
-        "client_id": Config.SPOTIFY_CLIENT_ID,
-        "client_secret": Config.SPOTIFY_CLIENT_SECRET,
-    }
-
-    response = requests.post(SPOTIFY_TOKEN_URL, data=token_data)
     try:
+        response = spotify.request_token(
+            "authorization_code", code=code, redirect_uri=Config.SPOTIFY_REDIRECT_URI
+        )
         token_info = response.json()
-    except requests.exceptions.JSONDecodeError:
+    except requests.exceptions.RequestException:
         return jsonify({"error": "Failed to retrieve access token from Spotify"}), 400
 
     if "access_token" not in token_info:
         return jsonify({"error": "Failed to retrieve access token"}), 400
 
     access_token = token_info["access_token"]
-    refresh_token = token_info.get("refresh_token")
-    expires_in = token_info.get("expires_in", 3600)
 
-    headers = {"Authorization": f"Bearer {access_token}"}
+    # Profile, top artists and top tracks don't depend on each other: fetch them concurrently
+    user_future = spotify.get_async("me", access_token)
+    try:
+        top_artists, top_genres, top_tracks = fetch_taste_snapshot(access_token)
+        user_data = snapshot_json(user_future.result())
+    except requests.exceptions.RequestException:
+        return jsonify({"error": "Failed to fetch profile data from Spotify"}), 502
 
-    # Get user profile
-    user_response = requests.get(f"{SPOTIFY_API_BASE_URL}me", headers=headers)
-    user_data = user_response.json()
     spotify_id = user_data.get("id")
     if not spotify_id:
         return jsonify({"error": "Spotify ID not found"}), 400
 
-    # Fetch top artists and tracks
-    top_artists_res = requests.get(f"{SPOTIFY_API_BASE_URL}me/top/artists?limit=10&time_range=short_term", headers=headers)
-    top_tracks_res = requests.get(f"{SPOTIFY_API_BASE_URL}me/top/tracks?limit=10&time_range=short_term", headers=headers)
+    save_login(spotify_id, token_info, top_artists, top_tracks, top_genres)
+    return login_redirect(spotify_id)
 
-    # Process top artists
-    artist_items = top_artists_res.json().get("items", [])
-    top_artists = []
-    top_genres = set()
 
-    for artist in artist_items:
-        top_artists.append({
-            "name": artist["name"],
-            "genres": artist.get("genres", []),
-            "images": artist.get("images", []),
-            "external_urls": artist.get("external_urls", {})
-        })
-        top_genres.update(artist.get("genres", []))
-
-    top_tracks = [track["name"] for track in top_tracks_res.json().get("items", [])]
+def save_login(spotify_id, token_info, top_artists, top_tracks, top_genres):
+    """Store or update the user with fresh tokens and listening data, and remember them in the session."""
+    access_token = token_info["access_token"]
+    refresh_token = token_info.get("refresh_token")
+    expires_in = token_info.get("expires_in", 3600)
 
     # Store or update user in DB
-    user = User.query.filter_by(spotify_id=spotify_id).first()
+    user = load_user(spotify_id)
     if not user:
         user = User(
             spotify_id=spotify_id,
             access_token=access_token,
             refresh_token=refresh_token,
             expires_at=datetime.utcnow() + timedelta(seconds=expires_in),
-            top_artists=json.dumps(top_artists),
-            top_tracks=json.dumps(top_tracks),
-            top_genres=json.dumps(list(top_genres))
         )
         db.session.add(user)
+        remember_user(user)
     else:
+        # The row may come from the hot-user cache: compare the new data against what is stored now
+        db.session.refresh(user)
         user.access_token = access_token
         user.refresh_token = refresh_token
         user.expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
-        user.top_artists = json.dumps(top_artists)
-        user.top_tracks = json.dumps(top_tracks)
-        user.top_genres = json.dumps(list(top_genres))
 
-    db.session.commit()
+    if user.update_listening_data(top_artists, top_tracks, top_genres):
+        refresh_user_in_index(user)
+    response_cache.invalidate_user(spotify_id)
 
     # Store in session
     session["spotify_id"] = spotify_id
     session["access_token"] = access_token
     session["refresh_token"] = refresh_token
 
+
+def login_redirect(spotify_id):
     # ✅ Check for inviter_id in session (set during login)
     inviter_id = session.pop("inviter_id", None)
 
@@ -130,101 +131,236 @@ def callback():
 
 @auth.route("/recently-played", methods=["GET"])
 def recently_played():
-    return fetch_spotify_data("me/player/recently-played")
+    """
+    The user's listening history from the local play log, newest first (?limit=&before=<ms cursor>).
+    The first page first pulls plays newer than the last stored one from Spotify, at most once
+    per RECENTLY_PLAYED_POLL_INTERVAL; if Spotify is unavailable the stored history is served as is.
+    """
+    spotify_id = request.args.get("spotify_id")
+    if not spotify_id:
+        return jsonify({"error": "Missing spotify_id"}), 400
+    user = load_user(spotify_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    try:
+        limit = min(max(int(request.args.get("limit", 20)), 1), 50)
+        before = int(request.args["before"]) if request.args.get("before") else None
+    except ValueError:
+        return jsonify({"error": "limit and before must be integers"}), 400
+
+    if before is None and poll_due(user):
+        newest = user.last_played_at
+        try:
+            poll_new_plays(user, token_manager.access_token(user))
+        except (requests.exceptions.RequestException, TokenRefreshError) as error:
+            record_error("recently_played_poll", f"{spotify_id}: {error}")
+        db.session.commit()
+        if user.last_played_at != newest:
+            comparison_cache.invalidate_user(spotify_id)
+
+    plays, next_before = history_page(user, before, limit)
+    return cacheable_response({
+        "items": [
+            {"track": {"name": play.track.name}, "played_at": play.played_at.isoformat(timespec="milliseconds") + "Z"}
+            for play in plays
+        ],
+        "next_before": next_before,
+    }, max_age=Config.RECENTLY_PLAYED_POLL_INTERVAL)
 
 @auth.route("/top-artists", methods=["GET"])
 def top_artists():
     spotify_id = request.args.get("spotify_id")
     if not spotify_id:
         return jsonify({"error": "Missing spotify_id"}), 400
-    user = User.query.filter_by(spotify_id=spotify_id).first()
+    user = load_user(spotify_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
-    return fetch_spotify_data("me/top/artists", user)
+    return serve_snapshot(user, lambda u: RawJSON('{"items":' + (u.top_artists or "[]") + "}")) \
+        or fetch_spotify_data("me/top/artists", user)
 
 @auth.route("/top-tracks", methods=["GET"])
 def top_tracks():
     spotify_id = request.args.get("spotify_id")
     if not spotify_id:
         return jsonify({"error": "Missing spotify_id"}), 400
-    user = User.query.filter_by(spotify_id=spotify_id).first()
+    user = load_user(spotify_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
-    return fetch_spotify_data("me/top/tracks", user)
+    return serve_snapshot(user, lambda u: RawJSON('{"items":' + (u.top_tracks or "[]") + "}")) \
+        or fetch_spotify_data("me/top/tracks", user)
 
 @auth.route("/top-genres", methods=["GET"])
 def top_genres():
     spotify_id = request.args.get("spotify_id")
     if not spotify_id:
         return jsonify({"error": "Missing spotify_id"}), 400
-    user = User.query.filter_by(spotify_id=spotify_id).first()
+    user = load_user(spotify_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    response = fetch_spotify_data("me/top/artists", user)
-    if isinstance(response, tuple):
-        return response
+    snapshot = serve_snapshot(user, lambda u: {"top_genres": u.genre_names()})
+    if snapshot:
+        return snapshot
+
+    artist_data, error = get_spotify_payload("me/top/artists", user, requested_time_range())
+    if error:
+        return error
 
-    artist_data = response.get_json()
     genre_list = []
     for artist in artist_data.get("items", []):
         genre_list.extend(artist.get("genres", []))
 
-    return jsonify({"top_genres": list(set(genre_list))})
-
-def fetch_spotify_data(endpoint, user):
-    access_token = refresh_access_token(user)
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(f"{SPOTIFY_API_BASE_URL}{endpoint}?limit=10", headers=headers)
+    return cacheable_response({"top_genres": list(dict.fromkeys(genre_list))})  # Stable order keeps the ETag stable
 
+def parse_top_artists(data):
+    """Extract the artist records we store and the user's genres (in first-seen order) from a top-artists payload."""
+    top_artists = []
+    genres = {}
+    for artist in data.get("items", []):
+        top_artists.append(artist_record(artist))
+        genres.update(dict.fromkeys(artist.get("genres", [])))
+    return top_artists, list(genres)
+
+def parse_top_tracks(data):
+    """The track records we store (and serve) from a top-tracks payload."""
+    return [track_record(track) for track in data.get("items", [])]
+
+def snapshot_json(response):
+    """
+    The JSON body of a successful snapshot call. Anything but a 200 (a 429 or 5xx left after
+    retries, with its error body) raises requests' HTTPError, so it is never stored as tastes.
+    """
     if response.status_code != 200:
-        return jsonify({"error": f"Failed to fetch {endpoint}"}), response.status_code
+        raise requests.exceptions.HTTPError(f"{response.url} returned {response.status_code}", response=response)
+    return loads(response.content)
+
+def fetch_taste_snapshot(access_token):
+    """
+    Fetch top artists and top tracks concurrently; returns (top_artists, top_genres, top_tracks).
+    Raises requests' HTTPError when either call fails (see snapshot_json).
+    """
+    top_artists_future = spotify.get_async("me/top/artists", access_token, SNAPSHOT_PARAMS)
+    top_tracks_future = spotify.get_async("me/top/tracks", access_token, SNAPSHOT_PARAMS)
+    return parse_taste_snapshot(top_artists_future.result(), top_tracks_future.result())
+
+def parse_taste_snapshot(top_artists_response, top_tracks_response):
+    """(top_artists, top_genres, top_tracks) from the two snapshot responses (requests or httpx)."""
+    top_artists, top_genres = parse_top_artists(snapshot_json(top_artists_response))
+    top_tracks = parse_top_tracks(snapshot_json(top_tracks_response))
+    return top_artists, top_genres, top_tracks
+
+def requested_time_range():
+    """The time_range a Spotify-backed route serves: the snapshot's when the request names none."""
+    return request.args.get("time_range", SNAPSHOT_PARAMS["time_range"])
+
+def serve_snapshot(user, build):
+    """
+    Answer from the stored listening data when the request asks for the snapshot's time range.
+    A stale snapshot is still served, and a background refresh is queued instead of waiting on Spotify.
+    Returns None when the caller has to go to Spotify (no snapshot yet, or another time range).
+    """
+    if requested_time_range() != SNAPSHOT_PARAMS["time_range"]:
+        return None
+    if user.synced_at is None:
+        return None
+    if user.is_snapshot_stale(Config.SYNC_STALE_AFTER):
+        enqueue_sync(user.spotify_id)
+    return cacheable_response(build(user))
+
+def cacheable_response(data, max_age=None):
+    """JSON response with an ETag and private Cache-Control; answers If-None-Match with 304."""
+    if isinstance(data, RawJSON):
+        response = current_app.response_class(data + "\n", mimetype="application/json")
+    else:
+        response = jsonify(data)
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.max_age = response_cache.ttl if max_age is None else max_age
+    return response.make_conditional(request)
+
+def get_spotify_payload(endpoint, user, time_range=None, params=None):
+    """
+    Return (data, None) for a Spotify proxy endpoint, or (None, error_response).
+
+    Served from the per-user response cache while fresh; once stale, Spotify is asked
+    with If-None-Match and a 304 reuses the cached payload without touching the database.
+    Only a changed payload fetched with SNAPSHOT_PARAMS is written back to the user's stored tastes.
+    """
+    data, error, call = cached_payload(endpoint, user, time_range, params)
+    if call is None:
+        return data, error
 
-    data = response.json()
+    try:
+        access_token = token_manager.access_token(user)
+    except TokenRefreshError as error:
+        return None, (jsonify({"error": str(error)}), 401)
+
+    try:
+        response = spotify.get(endpoint, access_token, call["params"], call["headers"])
+    except requests.exceptions.RequestException:
+        return None, (jsonify({"error": f"Failed to fetch {endpoint}"}), 502)
+
+    return payload_from_response(endpoint, user, call, response)
+
+def cached_payload(endpoint, user, time_range=None, params=None):
+    """
+    The cache half of get_spotify_payload (shared with the async routes): returns (data, error, call).
+    `data` when the response cache answers, `error` for an unknown time_range, otherwise the
+    upstream `call` to make: {"key", "entry", "params", "headers"}.
+    """
+    if time_range and time_range not in TIME_RANGES:
+        return None, (jsonify({"error": "Invalid time_range"}), 400), None
+
+    key = response_cache.key(user.spotify_id, endpoint, time_range)
+    entry = response_cache.get(key)
+    if response_cache.is_fresh(entry):
+        response_cache.count("hits")
+        return entry["data"], None, None
+
+    params = {"limit": 10, **(params or {})}
+    if time_range:
+        params["time_range"] = time_range
+    headers = {"If-None-Match": entry["etag"]} if entry and entry.get("etag") else None
+    return None, None, {"key": key, "entry": entry, "params": params, "headers": headers}
+
+def payload_from_response(endpoint, user, call, response):
+    """
+    The response half of get_spotify_payload: (data, error) from Spotify's answer to `call`
+    (a requests or httpx response). Caches it, and writes a changed snapshot back to the user.
+    """
+    key, entry = call["key"], call["entry"]
+    if response.status_code == 304 and entry:
+        response_cache.count("revalidated")
+        response_cache.touch(key, entry)
+        return entry["data"], None
 
+    if response.status_code != 200:
+        return None, (jsonify({"error": f"Failed to fetch {endpoint}"}), response.status_code)
+
+    response_cache.count("misses")
+    data = trim_payload(endpoint, loads(response.content))
+    response_cache.put(key, data, response.headers.get("ETag"))
+    if call["params"] == SNAPSHOT_PARAMS:  # Other time ranges and limits are not what the profile stores
+        store_payload(endpoint, user, data)
+    return data, None
+
+def store_payload(endpoint, user, data):
+    """Write a changed top-artists/top-tracks payload back to the user's stored tastes."""
+    db.session.refresh(user)  # Change detection must not compare against a stale hot-cache copy
     if "top/artists" in endpoint:
-        top_artists = []
-        genres = set()
-        for artist in data.get("items", []):
-            top_artists.append({
-                "name": artist["name"],
-                "genres": artist.get("genres", []),
-                "images": artist.get("images", []),
-                "external_urls": artist.get("external_urls", {})
-            })
-            genres.update(artist.get("genres", []))
-        user.top_artists = json.dumps(top_artists)
-        user.top_genres = json.dumps(list(genres))
+        if user.set_top_artists(*parse_top_artists(data)):
+            db.session.commit()
+            refresh_user_in_index(user)
 
     elif "top/tracks" in endpoint:
-        user.top_tracks = json.dumps([track["name"] for track in data.get("items", [])])
-
-    db.session.commit()
-    return jsonify(data)
+        if user.set_top_tracks(data.get("items", [])):  # Already trimmed to track records
+            db.session.commit()
 
-def refresh_access_token(user):
-    if not user.is_token_expired():
-        return user.access_token
-    if not user.refresh_token:
-        return jsonify({"error": "No refresh token available"}), 400
-
-    payload = {
-        "grant_type": "refresh_token",
-        "refresh_token": user.refresh_token,
-        "client_id": Config.SPOTIFY_CLIENT_ID,
-        "client_secret": Config.SPOTIFY_CLIENT_SECRET,
-    }
-
-    response = requests.post(SPOTIFY_TOKEN_URL, data=payload)
-    token_info = response.json()
-    if "access_token" not in token_info:
-        return jsonify({"error": "Failed to refresh access token"}), 400
-
-    user.access_token = token_info["access_token"]
-    user.expires_at = datetime.utcnow() + timedelta(seconds=3600)
-    db.session.commit()
-
-    return user.access_token
+def fetch_spotify_data(endpoint, user):
+    data, error = get_spotify_payload(endpoint, user, requested_time_range())
+    if error:
+        return error
+    return cacheable_response(data)
 
 @auth.route("/logout")
 def logout():
@@ -240,16 +376,13 @@ def full_top_artists():
     if not spotify_id:
         return jsonify({"error": "Missing spotify_id"}), 400
 
-    user = User.query.filter_by(spotify_id=spotify_id).first()
+    user = load_user(spotify_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    access_token = refresh_access_token(user)
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(f"{SPOTIFY_API_BASE_URL}me/top/artists?limit=10&time_range=short_term", headers=headers)
-
-    if response.status_code != 200:
-        return jsonify({"error": "Failed to fetch top artists from Spotify"}), response.status_code
+    data, error = get_spotify_payload("me/top/artists", user, "short_term")
+    if error:
+        return jsonify({"error": "Failed to fetch top artists from Spotify"}), error[1]
 
-    return jsonify(response.json())
+    return cacheable_response(data)
 
@@ -0,0 +1,111 @@
+import threading
+from collections import OrderedDict
+
+from backend.genre_taxonomy import taxonomy
+
+PAIRED_FIELDS = [
+    ("user1_vector", "user2_vector"),
+    ("user1_recommended_artists", "user2_recommended_artists"),
+]
+
+
+def swap_users(result):
+    """The same comparison seen from the other user's side (user1_* ↔ user2_*)."""
+    swapped = dict(result)
+    for first, second in PAIRED_FIELDS:
+        if first in result and second in result:
+            swapped[first], swapped[second] = result[second], result[first]
+    return swapped
+
+
+def taste_key(user, scoring):
+    """What a cached result for this user depends on: their tastes, plus their plays and imported tracks for history scoring."""
+    if scoring == "history":
+        return user.taste_version, user.last_played_at, user.library_changed_at
+    return user.taste_version
+
+
+class ComparisonCache:
+    """
+    LRU cache of /compare-users results.
+
+    Keyed by the unordered user pair, both users' taste versions, the scoring mode, the
+    generation of any population statistics the score uses (the IDF version for weighted and
+    history scoring) and the taxonomy digest, so a profile rewrite, an IDF refresh or a taxonomy
+    reload makes old entries unreachable; invalidate_user() also drops a user's entries eagerly.
+    Results are stored for the pair in sorted order and swapped on the way out when needed.
+    """
+
+    def __init__(self, maxsize=5000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._by_user = {}  # spotify_id → set of keys involving that user
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(user1, user2, scoring, generation):
+        a, b = sorted((user1, user2), key=lambda u: u.spotify_id)
+        key = (
+            a.spotify_id, taste_key(a, scoring), b.spotify_id, taste_key(b, scoring),
+            scoring, generation, taxonomy().source_digest,
+        )
+        return key, a is not user1
+
+    def get_or_compute(self, user1, user2, scoring, compute, generation=None):
+        """Return the cached result for (user1, user2), computing and storing it on a miss."""
+        key, swapped = self._key(user1, user2, scoring, generation)
+        with self._lock:
+            result = self._data.get(key)
+            if result is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if result is None:
+            result = compute(user1, user2)
+            canonical = swap_users(result) if swapped else result
+            self._store(key, canonical)
+            return result
+        return swap_users(result) if swapped else result
+
+    def _store(self, key, result):
+        with self._lock:
+            self._data[key] = result
+            self._data.move_to_end(key)
+            for spotify_id in (key[0], key[2]):
+                self._by_user.setdefault(spotify_id, set()).add(key)
+            while len(self._data) > self.maxsize:
+                old_key, _ = self._data.popitem(last=False)
+                self._forget(old_key)
+                self.evictions += 1
+
+    def _forget(self, key):
+        for spotify_id in (key[0], key[2]):
+            keys = self._by_user.get(spotify_id)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[spotify_id]
+
+    def invalidate_user(self, spotify_id):
+        """Drop every cached comparison involving the user (called when their tastes change)."""
+        with self._lock:
+            for key in list(self._by_user.get(spotify_id, ())):
+                self._data.pop(key, None)
+                self._forget(key)
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
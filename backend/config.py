@@ -1,9 +1,63 @@
+import json
 import os
 
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY") or "supersecretkey"
-    SQLALCHEMY_DATABASE_URI = "sqlite:///database.db"  # ✅ Ensure this is set
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///database.db")  # ✅ Ensure this is set
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = json.loads(os.environ.get("DATABASE_ENGINE_OPTIONS", "{}"))  # Extra create_engine kwargs
+    DATABASE_POOL_SIZE = int(os.environ.get("DATABASE_POOL_SIZE", 10))  # Pooled connections per process
+    DATABASE_MAX_OVERFLOW = int(os.environ.get("DATABASE_MAX_OVERFLOW", 10))  # Extra connections allowed under bursts
+    DATABASE_POOL_TIMEOUT = int(os.environ.get("DATABASE_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+    DATABASE_POOL_RECYCLE = int(os.environ.get("DATABASE_POOL_RECYCLE", 1800))  # Reopen server connections after this long
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "wal")  # "delete" restores SQLite's default journaling
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "normal")  # "full" fsyncs on every commit
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))  # Milliseconds a writer waits for the lock
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))  # Bytes of the file read via mmap (0 disables)
     SPOTIFY_CLIENT_ID = os.environ.get("SPOTIFY_CLIENT_ID", "a5c36a62868e4920af2a80e69c24506a")
     SPOTIFY_CLIENT_SECRET = os.environ.get("SPOTIFY_CLIENT_SECRET", "19dc1fb765e84ea8bed946735948acfc")
     SPOTIFY_REDIRECT_URI = "http://127.0.0.1:5000/callback"
+    SPOTIFY_TOKEN_URL = os.environ.get("SPOTIFY_TOKEN_URL", "https://accounts.spotify.com/api/token")
+    SPOTIFY_API_BASE_URL = os.environ.get("SPOTIFY_API_BASE_URL", "https://api.spotify.com/v1/")
+    SPOTIFY_TIMEOUT = (3.05, 10)  # (connect, read) seconds for every Spotify call
+    SPOTIFY_MAX_WORKERS = int(os.environ.get("SPOTIFY_MAX_WORKERS", 16))  # Max concurrent Spotify calls per process
+    SPOTIFY_MAX_RETRIES = int(os.environ.get("SPOTIFY_MAX_RETRIES", 3))  # Retries on 429/5xx/connection errors
+    SPOTIFY_REQUEST_MAX_BACKOFF = float(os.environ.get("SPOTIFY_REQUEST_MAX_BACKOFF", 2))  # Longest retry sleep while an HTTP request waits (background jobs: 30)
+    SPOTIFY_ASYNC_MAX_CONCURRENCY = int(os.environ.get("SPOTIFY_ASYNC_MAX_CONCURRENCY", 256))  # Max concurrent Spotify calls per ASGI worker event loop
+    ASGI_SYNC_THREADS = int(os.environ.get("ASGI_SYNC_THREADS", 16))  # Threads per ASGI worker for database work and the plain Flask routes
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")  # "memory" or "disk"
+    RESPONSE_CACHE_PATH = os.environ.get(
+        "RESPONSE_CACHE_PATH",
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), "instance", "response_cache.sqlite"),
+    )
+    RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 300))  # Seconds before revalidating with Spotify
+    RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 10000))  # Max cached payloads
+    TOKEN_REFRESH_SKEW = int(os.environ.get("TOKEN_REFRESH_SKEW", 60))  # Treat tokens as expired this many seconds early
+    TOKEN_REFRESH_LEAD = int(os.environ.get("TOKEN_REFRESH_LEAD", 300))  # Background renewal window before expires_at
+    TOKEN_REFRESH_INTERVAL = int(os.environ.get("TOKEN_REFRESH_INTERVAL", 60))  # Seconds between renewal sweeps (0 disables)
+    SYNC_STALE_AFTER = int(os.environ.get("SYNC_STALE_AFTER", 3600))  # Seconds before a stored snapshot is re-synced
+    SYNC_BATCH_SIZE = int(os.environ.get("SYNC_BATCH_SIZE", 20))  # Jobs claimed per worker poll
+    SYNC_RATE_LIMIT = float(os.environ.get("SYNC_RATE_LIMIT", 5))  # Spotify requests per second for the sync worker
+    SYNC_POLL_INTERVAL = int(os.environ.get("SYNC_POLL_INTERVAL", 5))  # Seconds to sleep when the queue is empty
+    LIBRARY_IMPORT_CONCURRENCY = int(os.environ.get("LIBRARY_IMPORT_CONCURRENCY", 4))  # Pages fetched ahead per import
+    RECENTLY_PLAYED_POLL_INTERVAL = int(os.environ.get("RECENTLY_PLAYED_POLL_INTERVAL", 60))  # Min seconds between polls per user
+    HISTORY_WINDOW_DAYS = int(os.environ.get("HISTORY_WINDOW_DAYS", 90))  # Plays considered by history scoring
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 1000))  # Hot users kept across requests (0 disables)
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 30))  # Seconds another process's write can go unseen
+    COMPARISON_CACHE_SIZE = int(os.environ.get("COMPARISON_CACHE_SIZE", 5000))  # Cached /compare-users results
+    IDF_REFRESH_INTERVAL = int(os.environ.get("IDF_REFRESH_INTERVAL", 60))  # Seconds one population IDF snapshot scores weighted/history comparisons
+    TASTE_INDEX_REFRESH_INTERVAL = int(os.environ.get("TASTE_INDEX_REFRESH_INTERVAL", 10))  # Seconds between catching the similarity/ANN indexes up with other processes (0 disables)
+    ANN_MIN_USERS = int(os.environ.get("ANN_MIN_USERS", 1_000_000))  # /matches?mode=approximate is answered exactly below this many users (exact wins up to 200k, see ann_index)
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))  # Share of requests run under cProfile (0 disables)
+    PROFILE_DIR = os.environ.get(
+        "PROFILE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "instance", "profiles")
+    )
+    JSON_BACKEND = os.environ.get("JSON_BACKEND", "auto")  # "auto" (orjson, then msgspec, then stdlib), or one of them
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))  # Bytes below which responses are sent uncompressed
+    COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))  # zlib level, 1 (fastest) to 9
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 4))  # 0-11; low keeps per-request cost down
+    TAXONOMY_ARTIFACT_PATH = os.environ.get(
+        "TAXONOMY_ARTIFACT_PATH",
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), "instance", "genre_taxonomy.marshal"),
+    )  # Optional compiled cache of the taxonomy JSON (`flask taxonomy build`); ignored when missing or stale
+    TAXONOMY_RELOAD_INTERVAL = int(os.environ.get("TAXONOMY_RELOAD_INTERVAL", 30))  # Seconds between checks of the taxonomy JSON (0 disables)
@@ -0,0 +1,65 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def normalize_database_uri(uri):
+    """Accept Heroku-style `postgres://` URLs, which SQLAlchemy 1.4+ no longer recognizes."""
+    if uri.startswith("postgres://"):
+        return "postgresql://" + uri[len("postgres://"):]
+    return uri
+
+
+def is_memory_sqlite(url):
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+
+    Server databases (PostgreSQL, ...) get a sized connection pool with pre-ping and recycling.
+    File SQLite gets the same pool size (connections are cheap, but the pool bounds open files);
+    in-memory SQLite keeps Flask-SQLAlchemy's single static connection.
+    """
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    options = {}
+    if not is_memory_sqlite(url):
+        options["pool_size"] = config["DATABASE_POOL_SIZE"]
+        options["max_overflow"] = config["DATABASE_MAX_OVERFLOW"]
+        options["pool_timeout"] = config["DATABASE_POOL_TIMEOUT"]
+    if url.get_backend_name() != "sqlite":
+        options["pool_pre_ping"] = True  # Survive server restarts / idle connections closed by a proxy
+        options["pool_recycle"] = config["DATABASE_POOL_RECYCLE"]
+    return {**options, **config.get("SQLALCHEMY_ENGINE_OPTIONS", {})}
+
+
+def sqlite_pragmas(config):
+    """Connect-time pragmas for SQLite; a setting left empty keeps SQLite's own default."""
+    pragmas = {
+        "journal_mode": config["SQLITE_JOURNAL_MODE"],
+        "synchronous": config["SQLITE_SYNCHRONOUS"],
+        "busy_timeout": config["SQLITE_BUSY_TIMEOUT"],
+        "mmap_size": config["SQLITE_MMAP_SIZE"],
+    }
+    return {name: value for name, value in pragmas.items() if value not in (None, "")}
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """
+    Run the pragmas on every new connection of a SQLite engine.
+
+    WAL lets readers proceed while a commit is in progress and makes commits append-only;
+    synchronous=NORMAL drops the fsync per commit (still durable across application crashes,
+    only the last transactions can be lost on power failure); busy_timeout makes writers wait
+    for the lock instead of failing with "database is locked"; mmap_size reads pages through
+    the OS page cache instead of copying them.
+    """
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
@@ -0,0 +1,130 @@
+"""
+Response compression and validators for the API.
+
+    init_http_cache(app)           gzip (or brotli, when installed) above COMPRESS_MIN_SIZE
+    strong_etag(*parts)            ETag over what a response is built from, e.g. taste versions
+                                   (and the genre taxonomy every payload is mapped with)
+    validated(etag, build)         304 for a matching If-None-Match before build() runs
+
+A compressed body is a different representation, so its ETag gets the encoding appended
+("abc-gzip"), as Apache does. Validators coming back in If-None-Match are stripped of the
+suffix before any view sees them, so views compare against their plain ETags, and a 304 hands
+the suffix back. Streamed bodies (/compare-group) are compressed as they are generated.
+"""
+import hashlib
+import re
+import zlib
+
+from flask import current_app, g, make_response, request
+
+from backend.genre_taxonomy import taxonomy
+from backend.serialization import BACKEND
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)  # In order of preference
+COMPRESSIBLE = {"application/json", "text/plain", "text/html", "text/css", "text/javascript", "application/javascript"}
+PAYLOAD_VERSION = 3  # Bump when a validated payload changes shape, so clients don't keep the old one
+
+_ENCODED_ETAG = re.compile(r'-(br|gzip)"')
+
+
+def strong_etag(*parts):
+    """A strong ETag for a payload that depends only on `parts` (and the encoder and taxonomy behind it)."""
+    return hashlib.blake2b(
+        repr((PAYLOAD_VERSION, BACKEND, taxonomy().source_digest, parts)).encode(), digest_size=16
+    ).hexdigest()
+
+
+def validated(etag, build):
+    """
+    Answer If-None-Match with a 304 when it holds `etag`, without calling build(); otherwise
+    return build()'s response with the ETag attached. Either way the browser keeps the body
+    but revalidates before every use (private, no-cache), which a 304 makes cheap.
+    """
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(build())
+    if etag is not None:
+        response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def _compressor(encoding, config):
+    """(compress chunk, finish) for a streaming encoder."""
+    if encoding == "br":
+        encoder = brotli.Compressor(quality=config["COMPRESS_BROTLI_QUALITY"])
+        return encoder.process, encoder.finish
+    encoder = zlib.compressobj(config["COMPRESS_GZIP_LEVEL"], zlib.DEFLATED, 31)  # wbits 31: gzip container
+    return encoder.compress, encoder.flush
+
+
+def _compress_stream(chunks, encoding, config):
+    compress, finish = _compressor(encoding, config)
+    for chunk in chunks:
+        data = compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def _compressible(response):
+    return (
+        200 <= response.status_code < 300 and response.status_code not in (204, 206)
+        and response.mimetype in COMPRESSIBLE
+        and "Content-Encoding" not in response.headers
+        and not response.cache_control.no_transform
+        and not response.direct_passthrough  # send_file and friends
+    )
+
+
+def init_http_cache(app):
+    """Register validator normalization and response compression on the app."""
+    config = app.config
+
+    @app.before_request
+    def strip_encoded_etags():
+        header = request.environ.get("HTTP_IF_NONE_MATCH")
+        if header:
+            encoded = _ENCODED_ETAG.search(header)
+            g.etag_encoding = encoded.group(1) if encoded else None
+            request.environ["HTTP_IF_NONE_MATCH"] = _ENCODED_ETAG.sub('"', header)
+
+    @app.after_request
+    def compress_response(response):
+        if response.status_code == 304:
+            etag, weak = response.get_etag()
+            if etag and g.get("etag_encoding"):
+                response.set_etag(f"{etag}-{g.etag_encoding}", weak)  # The validator the client holds
+            response.vary.add("Accept-Encoding")
+            return response
+        if not _compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+
+        encoding = request.accept_encodings.best_match(ENCODINGS)
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding, config)
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < config["COMPRESS_MIN_SIZE"]:
+                return response
+            compress, finish = _compressor(encoding, config)
+            response.set_data(compress(body) + finish())
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
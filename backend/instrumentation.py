@@ -0,0 +1,327 @@
+"""
+Request, upstream and database instrumentation, exposed as Prometheus text at /metrics.
+
+    init_instrumentation(app)    request middleware: per-route latency histogram, status counters
+    instrument_engine(engine)    per-statement query latency, commit/rollback timing
+    @timed("name")               latency histogram for any hot function
+    record_error(where, error)   log a handled failure and count it
+
+Metrics live in this process: under gunicorn every worker keeps its own registry, and the
+`process` label on each sample (the pid) tells the workers apart when scraped one at a time.
+With PROFILE_SAMPLE_RATE > 0, that share of requests also runs under cProfile and is dumped
+to PROFILE_DIR as a .prof file (open with `python -m pstats` or snakeviz).
+"""
+import bisect
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+from functools import wraps
+
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("backend")
+
+# Seconds; request/upstream/query latencies
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds; in-process functions that usually take microseconds
+FUNCTION_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01, 0.1)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _sample(name, labels, value):
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+
+class Counter:
+    """Monotonic count per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = ("process", *labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self, pid):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield _sample(self.name, _labels(self.labelnames, (pid, *labels)), value)
+
+
+class Gauge(Counter):
+    """Current value per label combination (in-flight requests and the like)."""
+
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    """Bucketed observations per label combination, rendered cumulatively with _sum and _count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = ("process", *labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels → [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self, pid):
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        for labels, (counts, total) in sorted(values.items()):
+            base = _labels(self.labelnames, (pid, *labels))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                yield _sample(f"{self.name}_bucket", f'{base},le="{le}"', cumulative)
+            yield _sample(f"{self.name}_sum", base, total)
+            yield _sample(f"{self.name}_count", base, cumulative)
+
+
+class MetricsRegistry:
+    """Metrics of this process plus `stats()` snapshots of the app's caches, rendered on demand."""
+
+    def __init__(self):
+        self._metrics = []
+        self._stats = []  # (prefix, help, stats function)
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, prefix, help, stats):
+        """Expose each numeric field of `stats()` (a flat or {group: {field}} dict) as a `prefix_field` gauge."""
+        self._stats.append((prefix, help, stats))
+
+    def render(self):
+        pid = os.getpid()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples(pid))
+        for prefix, help, stats in self._stats:
+            for name, samples in self._stats_samples(prefix, stats(), pid).items():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _stats_samples(prefix, stats, pid):
+        by_name = {}
+        for key, value in stats.items():
+            if isinstance(value, dict):  # {group: {field: n}} → prefix_field{group="..."}
+                for field, n in value.items():
+                    if isinstance(n, (int, float)):
+                        by_name.setdefault(f"{prefix}_{field}", []).append(
+                            _sample(f"{prefix}_{field}", _labels(("process", "group"), (pid, key)), n)
+                        )
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                by_name.setdefault(f"{prefix}_{key}", []).append(
+                    _sample(f"{prefix}_{key}", _labels(("process",), (pid,)), value)
+                )
+        return by_name
+
+
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter(
+    "http_requests_total", "Requests served, by route and status.", ("method", "route", "status"))
+http_request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "Request latency, by route.", ("method", "route"))
+http_in_flight = metrics.gauge("http_requests_in_flight", "Requests being served.")
+upstream_requests = metrics.counter(
+    "spotify_requests_total", "Spotify calls (each retry counts), by endpoint and outcome.", ("endpoint", "outcome"))
+upstream_seconds = metrics.histogram(
+    "spotify_request_duration_seconds", "Latency of single Spotify calls, by endpoint.", ("endpoint",))
+upstream_retries = metrics.counter("spotify_retries_total", "Spotify calls retried, by endpoint.", ("endpoint",))
+db_query_seconds = metrics.histogram(
+    "db_query_duration_seconds", "Database statement latency, by statement type.", ("statement",))
+db_commit_seconds = metrics.histogram("db_commit_duration_seconds", "Session commit latency, including the flush.")
+db_rollbacks = metrics.counter("db_rollbacks_total", "Session rollbacks.")
+function_seconds = metrics.histogram(
+    "function_duration_seconds", "Latency of instrumented hot functions.", ("function",), FUNCTION_BUCKETS)
+errors = metrics.counter("app_errors_total", "Handled failures, by where they happened.", ("where",))
+profiled_requests = metrics.counter("profiled_requests_total", "Requests run under the sampling profiler.", ("route",))
+
+
+def timed(name):
+    """
+    Record each call's latency in function_duration_seconds{function=name}. Costs about a
+    microsecond per call: put it on a loop over items, not on a per-item helper.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                function_seconds.observe(time.perf_counter() - started, name)
+        return wrapper
+    return decorator
+
+
+def record_error(where, error):
+    """Log a failure the caller handles (instead of print) and count it in app_errors_total."""
+    errors.inc(where)
+    logger.warning("%s: %s", where, error)
+
+
+# ---------- database ----------
+
+_VERB = re.compile(r"\s*(\w+)")
+
+
+def instrument_engine(engine):
+    """Time every statement this engine runs, labelled by its verb (SELECT, INSERT, ...)."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        verb = _VERB.match(statement)
+        db_query_seconds.observe(time.perf_counter() - started, verb.group(1).upper() if verb else "OTHER")
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+@event.listens_for(Session, "before_commit")
+def _commit_started(session):
+    session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        db_commit_seconds.observe(time.perf_counter() - started)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _rolled_back(session, previous_transaction):
+    if previous_transaction.parent is None:  # outermost transaction only
+        session.info.pop("commit_started", None)
+        db_rollbacks.inc()
+
+
+# ---------- requests ----------
+
+def _route():
+    return request.url_rule.rule if request.url_rule else "<unmatched>"
+
+
+class RequestProfiler:
+    """Runs a sampled share of requests under cProfile, one at a time per process."""
+
+    def __init__(self, sample_rate, directory):
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self._busy = threading.Lock()
+
+    def start(self):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile, route):
+        try:
+            profile.disable()
+            os.makedirs(self.directory, exist_ok=True)
+            slug = re.sub(r"[^A-Za-z0-9]+", "-", route).strip("-") or "root"
+            profile.dump_stats(os.path.join(self.directory, f"{slug}-{time.time():.0f}-{os.getpid()}.prof"))
+            profiled_requests.inc(route)
+        except OSError as error:
+            record_error("profiler", error)
+        finally:
+            self._busy.release()
+
+
+def init_instrumentation(app):
+    """Register the request middleware and /metrics on the app."""
+    profiler = RequestProfiler(app.config["PROFILE_SAMPLE_RATE"], app.config["PROFILE_DIR"])
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        http_in_flight.inc()
+        g.profile = profiler.start()
+
+    @app.after_request
+    def record_request(response):
+        g.request_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request(error=None):
+        started = g.pop("request_started", None)
+        if started is None:
+            return
+        route = _route()
+        http_request_seconds.observe(time.perf_counter() - started, request.method, route)
+        http_requests.inc(request.method, route, g.pop("request_status", 500))
+        http_in_flight.dec()
+        profile = g.pop("profile", None)
+        if profile is not None:
+            profiler.finish(profile, route)
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.render(), content_type=CONTENT_TYPE)
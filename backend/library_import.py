@@ -0,0 +1,252 @@
+from collections import deque
+from datetime import datetime
+
+import click
+import requests
+from flask.cli import AppGroup
+
+from backend.config import Config
+from backend.extensions import db
+from backend.listening_history import parse_timestamp, store_plays
+from backend.serialization import loads
+from backend.models import (
+    Artist, Genre, ImportCursor, Track, User, UserSavedTrack, UserTopArtist, UserTopTrack,
+    get_or_create_by_name, get_or_create_by_spotify_id, insert_ignoring_conflicts, set_artist_genres, spotify_key,
+)
+from backend.spotify_client import spotify
+from backend.token_manager import token_manager, TokenRefreshError
+from backend.user_comparison import comparison_cache, refresh_user_in_index
+
+PAGE_SIZE = 50  # Spotify's maximum for every endpoint imported here
+TIME_RANGES = ("short_term", "medium_term", "long_term")
+
+library_cli = AppGroup("library", help="Full import of users' Spotify libraries.")
+
+
+class LibraryImportError(Exception):
+    """Spotify answered a page request with something other than 200."""
+
+
+# ---------- page sources ----------
+
+def fetch_page(endpoint, access_token, params):
+    return page_json(endpoint, spotify.get(endpoint, access_token, params))
+
+
+def page_json(endpoint, response):
+    if response.status_code != 200:
+        raise LibraryImportError(f"{endpoint} returned {response.status_code}")
+    return loads(response.content)
+
+
+def offset_pages(endpoint, access_token, params, start, window):
+    """
+    Yield (offset, page) in order from `start` to the end of an offset-paged endpoint.
+
+    The first page tells the total; after that up to `window` page requests are kept in flight,
+    so at most `window` pages are held in memory while the consumer stores the oldest one.
+    """
+    first = fetch_page(endpoint, access_token, {**params, "limit": PAGE_SIZE, "offset": start})
+    yield start, first
+
+    offsets = iter(range(start + PAGE_SIZE, first.get("total", 0), PAGE_SIZE))
+    inflight = deque()
+
+    def submit():
+        offset = next(offsets, None)
+        if offset is not None:
+            inflight.append((offset, spotify.get_async(
+                endpoint, access_token, {**params, "limit": PAGE_SIZE, "offset": offset}
+            )))
+
+    for _ in range(window):
+        submit()
+    while inflight:
+        offset, future = inflight.popleft()
+        page = page_json(endpoint, future.result())
+        submit()
+        yield offset, page
+
+
+def cursor_pages(endpoint, access_token, before=None):
+    """Yield pages walking back in time through a cursor-paged endpoint (recently-played)."""
+    while True:
+        params = {"limit": PAGE_SIZE, **({"before": before} if before else {})}
+        page = fetch_page(endpoint, access_token, params)
+        yield page
+        cursors = page.get("cursors") or {}
+        if not page.get("next") or not cursors.get("before"):
+            return
+        before = cursors["before"]
+
+
+# ---------- storing pages ----------
+
+def store_artists(items):
+    """Artist rows (with genres) for a page of Spotify artist objects."""
+    genre_rows = get_or_create_by_name(Genre, {g for artist in items for g in artist.get("genres", [])})
+    artist_rows = get_or_create_by_spotify_id(Artist, items)
+    set_artist_genres(
+        artist_rows.values(),
+        {artist_rows[spotify_key(a)].id: [genre_rows[g].id for g in a.get("genres", [])] for a in items},
+    )
+    return artist_rows
+
+
+def store_top_artists(user, time_range, offset, items):
+    artist_rows = store_artists(items)
+    db.session.add_all(
+        UserTopArtist(user_id=user.id, time_range=time_range, rank=offset + i, artist_id=artist_rows[spotify_key(a)].id)
+        for i, a in enumerate(items)
+    )
+
+
+def store_top_tracks(user, time_range, offset, items):
+    track_rows = get_or_create_by_spotify_id(Track, items)
+    db.session.add_all(
+        UserTopTrack(user_id=user.id, time_range=time_range, rank=offset + i, track_id=track_rows[spotify_key(t)].id)
+        for i, t in enumerate(items)
+    )
+
+
+def store_saved_tracks(user, items):
+    items = [item for item in items if item.get("track")]
+    track_rows = get_or_create_by_spotify_id(Track, (item["track"] for item in items))
+    insert_ignoring_conflicts(UserSavedTrack.__table__, [
+        {"user_id": user.id, "track_id": track_rows[spotify_key(item["track"])].id, "added_at": parse_timestamp(item.get("added_at"))}
+        for item in items
+    ])
+
+
+# ---------- import driver ----------
+
+def source_names():
+    return (
+        [f"top_artists:{r}" for r in TIME_RANGES]
+        + [f"top_tracks:{r}" for r in TIME_RANGES]
+        + ["saved_tracks", "recently_played"]
+    )
+
+
+def start_cursor(user, source, restart=False):
+    """The cursor to continue from: the unfinished one, or a fresh run that first clears the source's rows."""
+    cursor = db.session.get(ImportCursor, (user.id, source))
+    if cursor and cursor.status == "running" and not restart:
+        return cursor
+
+    kind, _, time_range = source.partition(":")
+    if kind == "top_artists":
+        UserTopArtist.query.filter_by(user_id=user.id, time_range=time_range).delete()
+    elif kind == "top_tracks":
+        UserTopTrack.query.filter_by(user_id=user.id, time_range=time_range).delete()
+    elif kind == "saved_tracks":
+        UserSavedTrack.query.filter_by(user_id=user.id).delete()
+    # recently_played is append-only: a new run just walks back from the latest play again
+
+    if cursor is None:
+        cursor = ImportCursor(user_id=user.id, source=source)
+        db.session.add(cursor)
+    cursor.status, cursor.offset, cursor.cursor, cursor.items = "running", 0, None, 0
+    cursor.started_at, cursor.finished_at = datetime.utcnow(), None
+    db.session.commit()
+    return cursor
+
+
+def import_source(user, source, access_token, window, restart=False):
+    """Page through one source, committing every page together with the cursor. Returns items stored."""
+    cursor = start_cursor(user, source, restart)
+    kind, _, time_range = source.partition(":")
+
+    if kind == "recently_played":
+        for page in cursor_pages("me/player/recently-played", access_token, cursor.cursor):
+            items = page.get("items", [])
+            store_plays(user, items)
+            cursor.cursor = (page.get("cursors") or {}).get("before")
+            save_progress(cursor, items)
+    else:
+        endpoint, store = {
+            "top_artists": ("me/top/artists", lambda offset, items: store_top_artists(user, time_range, offset, items)),
+            "top_tracks": ("me/top/tracks", lambda offset, items: store_top_tracks(user, time_range, offset, items)),
+            "saved_tracks": ("me/tracks", lambda offset, items: store_saved_tracks(user, items)),
+        }[kind]
+        params = {"time_range": time_range} if time_range else {}
+        for offset, page in offset_pages(endpoint, access_token, params, cursor.offset, window):
+            items = page.get("items", [])
+            store(offset, items)
+            cursor.offset = offset + len(items)
+            save_progress(cursor, items)
+
+    cursor.status, cursor.finished_at = "done", datetime.utcnow()
+    db.session.commit()
+    return cursor.items
+
+
+def save_progress(cursor, items):
+    """Commit a stored page together with the cursor that points past it."""
+    cursor.items += len(items)
+    cursor.updated_at = datetime.utcnow()
+    db.session.commit()
+
+
+def import_library(user, sources=None, window=None, restart=False):
+    """Import every source (or the given ones) for a user; returns {source: items stored}."""
+    window = window or Config.LIBRARY_IMPORT_CONCURRENCY
+    access_token = token_manager.access_token(user)
+    counts = {
+        source: import_source(user, source, access_token, window, restart)
+        for source in (sources or source_names())
+    }
+    apply_import(user, counts)
+    return counts
+
+
+def apply_import(user, counts):
+    """
+    Feed imported sources into comparisons: top artists extend the taste features (genres,
+    artists and their ranks), top and saved tracks join the play history in history scoring.
+    Both change the user's comparison cache keys and ETags; other processes' taste indexes
+    catch up from taste_changed_at.
+    """
+    kinds = {source.partition(":")[0] for source in counts}
+    tastes_changed = "top_artists" in kinds and user.refresh_features()
+    if kinds & {"top_tracks", "saved_tracks"}:
+        user.library_changed_at = datetime.utcnow()
+    db.session.commit()
+    if tastes_changed:
+        refresh_user_in_index(user)
+    else:
+        comparison_cache.invalidate_user(user.spotify_id)
+
+
+@library_cli.command("import")
+@click.option("--user", "spotify_ids", multiple=True, help="Spotify ID to import (repeatable).")
+@click.option("--all", "all_users", is_flag=True, help="Import every user with a refresh token.")
+@click.option("--source", "sources", multiple=True, type=click.Choice(source_names()), help="Limit to these sources.")
+@click.option("--concurrency", default=Config.LIBRARY_IMPORT_CONCURRENCY, show_default=True, help="Pages in flight.")
+@click.option("--restart", is_flag=True, help="Ignore unfinished cursors and start every source over.")
+def import_command(spotify_ids, all_users, sources, concurrency, restart):
+    """Page through users' top items, saved tracks and recent plays: `flask library import --user ID`."""
+    query = User.query.with_entities(User.spotify_id).filter(User.refresh_token.isnot(None))
+    if not all_users:
+        query = query.filter(User.spotify_id.in_(spotify_ids))
+    for spotify_id in [row.spotify_id for row in query]:  # Listed up front: every page commits
+        user = User.query.filter_by(spotify_id=spotify_id).first()
+        try:
+            counts = import_library(user, sources, concurrency, restart)
+            print(f"{user.spotify_id}: " + ", ".join(f"{source}={n}" for source, n in counts.items()))
+        except (requests.exceptions.RequestException, TokenRefreshError, LibraryImportError) as error:
+            db.session.rollback()
+            print(f"Import failed for {user.spotify_id} (resume by running again): {error}")
+
+
+@library_cli.command("status")
+@click.option("--user", "spotify_id", required=True)
+def status_command(spotify_id):
+    """Show import cursors for one user."""
+    user = User.query.filter_by(spotify_id=spotify_id).first()
+    if not user:
+        print("User not found")
+        return
+    for cursor in ImportCursor.query.filter_by(user_id=user.id).order_by(ImportCursor.source):
+        position = cursor.cursor if cursor.source == "recently_played" else cursor.offset
+        print(f"{cursor.source:<24} {cursor.status:<8} items={cursor.items:<6} at={position} updated={cursor.updated_at}")
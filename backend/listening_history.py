@@ -0,0 +1,141 @@
+import math
+from datetime import datetime, timedelta
+
+from backend.config import Config
+from backend.extensions import db
+from backend.instrumentation import record_error
+from backend.models import (
+    PlayEvent, Track, UserSavedTrack, UserTopTrack, get_or_create_by_spotify_id, insert_ignoring_conflicts, spotify_key,
+)
+from backend.spotify_client import spotify
+
+EPOCH = datetime(1970, 1, 1)
+MAX_POLL_PAGES = 20  # Upper bound on `after` pages per poll (50 plays each)
+
+
+def to_ms(moment):
+    """Naive UTC datetime → unix milliseconds (Spotify's cursor unit)."""
+    return (moment - EPOCH) // timedelta(milliseconds=1)
+
+
+def from_ms(ms):
+    return EPOCH + timedelta(milliseconds=int(ms))
+
+
+def parse_timestamp(value):
+    """Spotify's ISO 8601 UTC timestamps ('2024-01-31T20:44:04.589Z') as naive UTC datetimes."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None) if value else None
+
+
+def store_plays(user, items):
+    """
+    Append a page of recently-played items to the user's history; plays already stored are
+    skipped by the (user, played_at) key. Keeps `user.last_played_at` at the newest play.
+    """
+    items = [item for item in items if item.get("track") and item.get("played_at")]
+    if not items:
+        return
+    track_rows = get_or_create_by_spotify_id(Track, (item["track"] for item in items))
+    rows = [
+        {"user_id": user.id, "track_id": track_rows[spotify_key(item["track"])].id, "played_at": parse_timestamp(item["played_at"])}
+        for item in items
+    ]
+    insert_ignoring_conflicts(PlayEvent.__table__, rows)
+    newest = max(row["played_at"] for row in rows)
+    if user.last_played_at is None or newest > user.last_played_at:
+        user.last_played_at = newest
+
+
+def poll_due(user):
+    polled_at = user.plays_polled_at
+    return polled_at is None or datetime.utcnow() - polled_at >= timedelta(seconds=Config.RECENTLY_PLAYED_POLL_INTERVAL)
+
+
+def poll_new_plays(user, access_token):
+    """
+    Fetch only the plays newer than the newest stored one (Spotify's `after` cursor) and store them.
+    Returns how many pages came back; the caller commits. `plays_polled_at` is stamped only when
+    the poll completes, so a failed one is retried on the next request.
+    """
+    after = to_ms(user.last_played_at) if user.last_played_at else None
+    pages = 0
+    while pages < MAX_POLL_PAGES:
+        params = {"limit": 50, **({"after": after} if after is not None else {})}
+        response = spotify.get("me/player/recently-played", access_token, params)
+        if response.status_code != 200:
+            record_error("recently_played_poll", f"{user.spotify_id}: HTTP {response.status_code}")
+            return pages  # Pages stored so far stay; the cursor resumes after them
+        page = response.json()
+        pages += 1
+        items = page.get("items", [])
+        store_plays(user, items)
+        next_after = (page.get("cursors") or {}).get("after")
+        # Without a cursor only the latest 50 exist; with one, keep going while pages come back full
+        if after is None or len(items) < params["limit"] or not next_after or int(next_after) <= after:
+            break
+        after = int(next_after)
+    user.plays_polled_at = datetime.utcnow()
+    return pages
+
+
+def history_page(user, before=None, limit=20):
+    """
+    One page of stored plays, newest first, with keyset pagination on played_at (unique per user):
+    returns (plays, next_before), next_before being the cursor for the following page or None.
+    """
+    query = PlayEvent.query.filter(PlayEvent.user_id == user.id)
+    if before is not None:
+        query = query.filter(PlayEvent.played_at < from_ms(before))
+    plays = query.order_by(PlayEvent.played_at.desc()).limit(limit + 1).all()
+    next_before = to_ms(plays[limit - 1].played_at) if len(plays) > limit else None
+    return plays[:limit], next_before
+
+
+def play_counts(user_ids, since):
+    """{user_id: {track_id: plays}} over the window, for all users in one grouped query."""
+    counts = {user_id: {} for user_id in user_ids}
+    rows = (
+        db.session.query(PlayEvent.user_id, PlayEvent.track_id, db.func.count())
+        .filter(PlayEvent.user_id.in_(user_ids), PlayEvent.played_at >= since)
+        .group_by(PlayEvent.user_id, PlayEvent.track_id)
+    )
+    for user_id, track_id, plays in rows:
+        counts[user_id][track_id] = plays
+    return counts
+
+
+def library_tracks(user_ids):
+    """{user_id: {track_id, ...}} from the library import: saved tracks and every top-tracks ranking."""
+    tracks = {user_id: set() for user_id in user_ids}
+    rows = (
+        db.session.query(UserSavedTrack.user_id, UserSavedTrack.track_id)
+        .filter(UserSavedTrack.user_id.in_(user_ids))
+        .union(
+            db.session.query(UserTopTrack.user_id, UserTopTrack.track_id)
+            .filter(UserTopTrack.user_id.in_(user_ids))
+        )
+    )
+    for user_id, track_id in rows:
+        tracks[user_id].add(track_id)
+    return tracks
+
+
+def history_similarity(user1, user2):
+    """
+    Cosine similarity of two users' play counts per track over the last HISTORY_WINDOW_DAYS,
+    with counts damped to 1 + log(plays) so one song on repeat doesn't dominate. Tracks from
+    the library import (saved, or in a top-tracks ranking) that weren't played in the window
+    count as one play. None when either user has neither plays nor imported tracks.
+    """
+    since = datetime.utcnow() - timedelta(days=Config.HISTORY_WINDOW_DAYS)
+    user_ids = [user1.id, user2.id]
+    counts, library = play_counts(user_ids, since), library_tracks(user_ids)
+    w1, w2 = (
+        {**dict.fromkeys(library[user_id], 1.0), **{track: 1 + math.log(n) for track, n in counts[user_id].items()}}
+        for user_id in user_ids
+    )
+    if not w1 or not w2:
+        return None
+    dot = sum(weight * w2[track] for track, weight in w1.items() if track in w2)
+    norm = math.sqrt(sum(v * v for v in w1.values())) * math.sqrt(sum(v * v for v in w2.values()))
+    return dot / norm if norm else 0.0
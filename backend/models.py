@@ -1,25 +1,254 @@
-import requests
+import hashlib
+import threading
 from datetime import datetime, timedelta
-from flask import jsonify
 from backend.extensions import db
-from backend.config import Config
+from backend.serialization import canonical_dumps, loads
+from backend.taste_features import compute_features, decode_features, encode_features
+
+artist_genres = db.Table(
+    "artist_genre",
+    db.Column("artist_id", db.Integer, db.ForeignKey("artist.id"), primary_key=True),
+    db.Column("genre_id", db.Integer, db.ForeignKey("genre.id"), primary_key=True, index=True),
+)
+
+
+class Genre(db.Model):
+    """A Spotify genre string (e.g. 'afrobeats'), shared by every user and artist that has it."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), unique=True, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<Genre {self.name}>"
+
+
+class Artist(db.Model):
+    """An artist seen in some user's top artists, with its Spotify genres."""
+    id = db.Column(db.Integer, primary_key=True)
+    spotify_id = db.Column(db.String(64), unique=True, nullable=True, index=True)  # Upsert key (names aren't unique); NULL for rows stored before it
+    name = db.Column(db.String(200), nullable=False, index=True)
+    genres = db.relationship("Genre", secondary=artist_genres, lazy="selectin")
+
+    def __repr__(self):
+        return f"<Artist {self.name}>"
+
+
+class Track(db.Model):
+    """A track seen in some user's top tracks, saved tracks or plays (its ID and name are stored)."""
+    id = db.Column(db.Integer, primary_key=True)
+    spotify_id = db.Column(db.String(300), unique=True, nullable=True, index=True)  # Upsert key (same-title tracks are distinct); a URI for local files
+    name = db.Column(db.String(300), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<Track {self.name}>"
+
+
+class UserArtist(db.Model):
+    """User ↔ artist association with the artist's position in the user's top list."""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey("artist.id"), primary_key=True, index=True)
+    rank = db.Column(db.Integer, nullable=False)
+    artist = db.relationship("Artist", lazy="joined")
+
+
+class UserGenre(db.Model):
+    """User ↔ genre association; rank is the order the genre first appeared in the user's top artists."""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    genre_id = db.Column(db.Integer, db.ForeignKey("genre.id"), primary_key=True, index=True)
+    rank = db.Column(db.Integer, nullable=False)
+    genre = db.relationship("Genre", lazy="joined")
+
+
+class UserTrack(db.Model):
+    """User ↔ track association with the track's position in the user's top list."""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    track_id = db.Column(db.Integer, db.ForeignKey("track.id"), primary_key=True, index=True)
+    rank = db.Column(db.Integer, nullable=False)
+    track = db.relationship("Track", lazy="joined")
+
+
+IMPORT_RANGE_ORDER = {"short_term": 0, "medium_term": 1, "long_term": 2}  # Most recent tastes first
+
+
+class UserTopArtist(db.Model):
+    """One entry of a user's full top-artists ranking for a time range, filled by the library import."""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    time_range = db.Column(db.String(16), primary_key=True)  # short_term | medium_term | long_term
+    rank = db.Column(db.Integer, primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey("artist.id"), nullable=False, index=True)
+    artist = db.relationship("Artist", lazy="joined")
+
+
+class UserTopTrack(db.Model):
+    """One entry of a user's full top-tracks ranking for a time range, filled by the library import."""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    time_range = db.Column(db.String(16), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    track_id = db.Column(db.Integer, db.ForeignKey("track.id"), nullable=False, index=True)
+    track = db.relationship("Track", lazy="joined")
+
+
+class UserSavedTrack(db.Model):
+    """A track in the user's Spotify library ("Liked Songs")."""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    track_id = db.Column(db.Integer, db.ForeignKey("track.id"), primary_key=True, index=True)
+    added_at = db.Column(db.DateTime, nullable=True)
+    track = db.relationship("Track", lazy="joined")
+
+
+class PlayEvent(db.Model):
+    """One play from the user's listening history. Append-only: a user can't play two tracks at the same instant."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    track_id = db.Column(db.Integer, db.ForeignKey("track.id"), nullable=False, index=True)
+    played_at = db.Column(db.DateTime, nullable=False)
+    track = db.relationship("Track", lazy="joined")
+
+    __table_args__ = (db.UniqueConstraint("user_id", "played_at", name="uq_play_event_user_played_at"),)
+
+
+class ImportCursor(db.Model):
+    """
+    Progress of one library import source for one user (e.g. 'saved_tracks', 'top_artists:long_term').
+    Committed with every page, so an interrupted import resumes after the last stored page.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    source = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default="running")  # running | done
+    offset = db.Column(db.Integer, nullable=False, default=0)  # Next offset, for offset-paged sources
+    cursor = db.Column(db.String(64), nullable=True)  # Next `before` cursor, for cursor-paged sources
+    items = db.Column(db.Integer, nullable=False, default=0)  # Items stored so far in this run
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+
+def canonical_json(value):
+    """Deterministic JSON (sorted keys, no whitespace) so identical data always serializes to identical text."""
+    return canonical_dumps(value)
+
+
+# Per listening-data column: how many refreshes rewrote it vs. found it unchanged
+profile_writes = {field: {"applied": 0, "skipped": 0} for field in ("top_artists", "top_genres", "top_tracks")}
+_profile_writes_lock = threading.Lock()  # Request threads and the sync worker write concurrently
+
+
+def record_profile_write(field, changed):
+    with _profile_writes_lock:
+        profile_writes[field]["applied" if changed else "skipped"] += 1
+    return changed
+
+
+def profile_write_stats():
+    with _profile_writes_lock:
+        return {field: dict(counts) for field, counts in profile_writes.items()}
+
+
+def insert_ignoring_conflicts(table, rows):
+    """
+    Insert rows, skipping any that hit a unique key another transaction already inserted.
+
+    Shared rows (genres, artists, tracks) are created by concurrent logins; on PostgreSQL a
+    plain INSERT of the same name from two transactions fails one of them. Rows are inserted
+    in sorted order so two transactions never wait on each other's keys in opposite orders.
+    """
+    if not rows:
+        return
+    rows = sorted(rows, key=lambda row: tuple(row.values()))
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table).on_conflict_do_nothing()
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table).on_conflict_do_nothing()
+    else:
+        statement = table.insert()
+    db.session.execute(statement, rows)
+
+
+def get_or_create_by_name(model, names):
+    """Return {name: row} for the given names, inserting the missing rows in one batch."""
+    names = set(names)
+    if not names:
+        return {}
+    rows = {row.name: row for row in model.query.filter(model.name.in_(names))}
+    missing = names - rows.keys()
+    if missing:
+        insert_ignoring_conflicts(model.__table__, [{"name": name} for name in missing])
+        rows.update((row.name, row) for row in model.query.filter(model.name.in_(missing)))
+    return rows
+
+
+def spotify_key(item):
+    """The Artist/Track upsert key of a Spotify object or stored record: its ID, or its URI for local files, which have none."""
+    return item.get("id") or item["uri"]
+
+
+def get_or_create_by_spotify_id(model, items):
+    """
+    Return {spotify_id: row} for Spotify artist or track objects (Artist or Track), inserting the
+    missing rows in one batch. Rows whose item was renamed on Spotify take the new name.
+    """
+    names = {spotify_key(item): item["name"] for item in items}
+    if not names:
+        return {}
+    rows = {row.spotify_id: row for row in model.query.filter(model.spotify_id.in_(names))}
+    missing = names.keys() - rows.keys()
+    if missing:
+        insert_ignoring_conflicts(model.__table__, [{"spotify_id": key, "name": names[key]} for key in missing])
+        rows.update((row.spotify_id, row) for row in model.query.filter(model.spotify_id.in_(missing)))
+    for key, row in rows.items():
+        if row.name != names[key]:
+            row.name = names[key]
+    return rows
+
+
+def set_artist_genres(artist_rows, genre_ids_by_artist):
+    """Replace each artist's genres, touching only the association rows that actually change."""
+    artist_ids = [artist.id for artist in artist_rows]
+    current = set(db.session.execute(
+        db.select(artist_genres.c.artist_id, artist_genres.c.genre_id)
+        .where(artist_genres.c.artist_id.in_(artist_ids))
+    ).tuples())
+    wanted = {(artist_id, genre_id) for artist_id, genre_ids in genre_ids_by_artist.items() for genre_id in genre_ids}
+    for artist_id, genre_id in current - wanted:
+        db.session.execute(artist_genres.delete().where(
+            artist_genres.c.artist_id == artist_id, artist_genres.c.genre_id == genre_id
+        ))
+    insert_ignoring_conflicts(
+        artist_genres, [{"artist_id": a, "genre_id": g} for a, g in wanted - current]
+    )
+    if current != wanted:
+        for artist in artist_rows:
+            db.session.expire(artist, ["genres"])
 
-SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
 
 class User(db.Model):
     """
     Database model to store Spotify user authentication details and listening data.
     """
     id = db.Column(db.Integer, primary_key=True)  # Unique user ID
-    spotify_id = db.Column(db.String(80), unique=True, nullable=False)  # ✅ Unique Spotify User ID
+    spotify_id = db.Column(db.String(80), unique=True, nullable=False, index=True)  # ✅ Unique Spotify User ID (unique index)
     access_token = db.Column(db.String(500), nullable=False)  # Spotify Access Token
     refresh_token = db.Column(db.String(500), nullable=True)  # Spotify Refresh Token
     expires_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.utcnow() + timedelta(seconds=3600))  
 
     # ✅ New Columns for Listening Data
     top_artists = db.Column(db.Text, nullable=True)  # JSON-encoded list of top artists
-    top_tracks = db.Column(db.Text, nullable=True)  # JSON-encoded list of top tracks
+    top_tracks = db.Column(db.Text, nullable=True)  # JSON-encoded list of top tracks (track records, as served)
     top_genres = db.Column(db.Text, nullable=True)  # JSON-encoded list of top genres
+    synced_at = db.Column(db.DateTime, nullable=True)  # Last full refresh of the listening data snapshot
+    taste_features = db.Column(db.LargeBinary, nullable=True)  # Packed comparison features (see taste_features.py)
+    taste_version = db.Column(db.String(16), nullable=True)  # Hash of taste_features; changes whenever tastes change
+    taste_changed_at = db.Column(db.DateTime, nullable=True, index=True)  # When taste_features last changed; other processes catch their indexes up from it
+    last_played_at = db.Column(db.DateTime, nullable=True)  # Newest stored PlayEvent (the `after` cursor for polling)
+    plays_polled_at = db.Column(db.DateTime, nullable=True)  # Last time recently-played was asked for new plays
+    library_changed_at = db.Column(db.DateTime, nullable=True)  # Last library import of top/saved tracks (history scoring reads them)
+
+    # Normalized taste tables (the JSON columns above are kept as a snapshot for API responses)
+    artist_links = db.relationship("UserArtist", order_by="UserArtist.rank", cascade="all, delete-orphan")
+    genre_links = db.relationship("UserGenre", order_by="UserGenre.rank", cascade="all, delete-orphan")
+    track_links = db.relationship("UserTrack", order_by="UserTrack.rank", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<User {self.spotify_id}>"
@@ -28,42 +257,163 @@ class User(db.Model):
         """Check if the user's Spotify access token is expired."""
         return datetime.utcnow() > self.expires_at
 
-    def update_tokens(self, new_access_token, expires_in=3600):
-        """Update the user's access token and refreshes expiration time."""
-        self.access_token = new_access_token
-        self.expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
-        db.session.commit()
+    def set_top_artists(self, artists, genres):
+        """
+        Write top artists (artist records with id/name/genres) and top genres to the JSON snapshot and taste tables.
+        Returns False, without touching the row or the taste tables, when both are unchanged.
+        """
+        artists_json = canonical_json(artists)
+        genres_json = canonical_json(list(genres))
+        artists_changed = record_profile_write("top_artists", artists_json != self.top_artists)
+        genres_changed = record_profile_write("top_genres", genres_json != self.top_genres)
+        if not (artists_changed or genres_changed) and self.taste_features is not None:
+            return False
+
+        self.top_artists = artists_json
+        self.top_genres = genres_json
+        self._store_features(encode_features(compute_features(*self.with_imported_tastes(artists, genres))))
+
+        genre_rows = get_or_create_by_name(
+            Genre, set(genres).union(*(a.get("genres", []) for a in artists))
+        )
+        artist_rows = get_or_create_by_spotify_id(Artist, artists)
+        set_artist_genres(
+            artist_rows.values(),
+            {artist_rows[spotify_key(a)].id: [genre_rows[g].id for g in a.get("genres", [])] for a in artists},
+        )
+
+        self.artist_links = []
+        self.genre_links = []
+        db.session.flush()  # Delete the old links before re-inserting rows with the same keys
+        self.artist_links = [
+            UserArtist(artist=artist_rows[key], rank=rank)
+            for rank, key in enumerate(dict.fromkeys(spotify_key(a) for a in artists))
+        ]
+        self.genre_links = [
+            UserGenre(genre=genre_rows[name], rank=rank)
+            for rank, name in enumerate(dict.fromkeys(genres))
+        ]
+        return True
+
+    def _store_features(self, taste_features):
+        self.taste_features = taste_features
+        self.taste_version = hashlib.blake2b(taste_features, digest_size=8).hexdigest()
+        self.taste_changed_at = datetime.utcnow()  # Other processes' indexes catch up from this
+
+    def refresh_features(self):
+        """
+        Recompute the packed features with the current taxonomy (from the JSON snapshot, or the
+        taste tables for users without one, plus any imported top artists) and store them if they
+        changed; returns True when they did.
+        """
+        if self.top_artists is not None:
+            artists, genres = loads(self.top_artists), loads(self.top_genres or "[]")
+        else:
+            artists, genres = self.artist_records(), self.genre_names()
+        taste_features = encode_features(compute_features(*self.with_imported_tastes(artists, genres)))
+        if taste_features == self.taste_features:
+            return False
+        self._store_features(taste_features)
+        return True
+
+    def set_top_tracks(self, tracks):
+        """
+        Write top tracks (track records with id/name/artists/external_urls) to the JSON snapshot and
+        the taste tables; returns False when they are unchanged.
+        """
+        tracks_json = canonical_json(tracks)
+        if not record_profile_write("top_tracks", tracks_json != self.top_tracks):
+            return False
+
+        self.top_tracks = tracks_json
+        track_rows = get_or_create_by_spotify_id(Track, tracks)
+        self.track_links = []
+        db.session.flush()
+        self.track_links = [
+            UserTrack(track=track_rows[key], rank=rank)
+            for rank, key in enumerate(dict.fromkeys(spotify_key(track) for track in tracks))
+        ]
+        return True
 
     def update_listening_data(self, artists, tracks, genres):
-        """Update user's top artists, top tracks, and top genres."""
-        self.top_artists = artists
-        self.top_tracks = tracks
-        self.top_genres = genres
+        """
+        Update user's top artists, top tracks, and top genres.
+        Returns True when the tastes changed (synced_at is stamped either way, so the sync worker moves on).
+        """
+        artists_changed = self.set_top_artists(artists, genres)
+        tracks_changed = self.set_top_tracks(tracks)
+        self.synced_at = datetime.utcnow()
         db.session.commit()
+        return artists_changed or tracks_changed
+
+    def is_snapshot_stale(self, max_age):
+        """True when the stored listening data is older than max_age seconds (or was never synced)."""
+        return self.synced_at is None or datetime.utcnow() - self.synced_at > timedelta(seconds=max_age)
 
-def refresh_access_token(user):
-    """Refresh the user's Spotify access token if expired."""
-    if not user.is_token_expired():
-        return user.access_token  
+    def genre_names(self):
+        """Top genres in rank order, read from the taste tables."""
+        return [link.genre.name for link in self.genre_links]
 
-    if not user.refresh_token:
-        return jsonify({"error": "No refresh token available"}), 400
+    def artist_records(self):
+        """Top artists in rank order as {'name', 'genres'} dicts, read from the taste tables."""
+        return [
+            {"name": link.artist.name, "genres": [g.name for g in link.artist.genres]}
+            for link in self.artist_links
+        ]
 
-    payload = {
-        "grant_type": "refresh_token",
-        "refresh_token": user.refresh_token,
-        "client_id": Config.SPOTIFY_CLIENT_ID,
-        "client_secret": Config.SPOTIFY_CLIENT_SECRET,
-    }
+    def imported_top_artists(self):
+        """
+        The library import's full top-artists rankings as {'name', 'genres'} dicts: short term
+        first, then medium and long term, each in rank order (artists repeat across ranges).
+        """
+        if self.id is None:
+            return []
+        links = (
+            UserTopArtist.query.filter_by(user_id=self.id)
+            .order_by(db.case(IMPORT_RANGE_ORDER, value=UserTopArtist.time_range), UserTopArtist.rank)
+        )
+        return [{"name": link.artist.name, "genres": [g.name for g in link.artist.genres]} for link in links]
 
-    response = requests.post(SPOTIFY_TOKEN_URL, data=payload)
-    token_info = response.json()
+    def with_imported_tastes(self, artists, genres):
+        """
+        The artists and genres the taste features are computed from: the top-artists snapshot,
+        followed by the imported top artists it doesn't already have and their genres.
+        """
+        names = {artist["name"] for artist in artists}
+        extra = {}
+        for artist in self.imported_top_artists():
+            if artist["name"] not in names:
+                extra.setdefault(artist["name"], artist)
+        if not extra:
+            return artists, genres
+        extra_genres = (genre for artist in extra.values() for genre in artist["genres"])
+        return [*artists, *extra.values()], list(dict.fromkeys([*genres, *extra_genres]))
 
-    if "access_token" not in token_info:
-        return jsonify({"error": "Failed to refresh access token"}), 400
+    def features(self):
+        """
+        Comparison features from the packed column, recomputed from the taste tables (and imported
+        top artists) if missing or built for another taxonomy (until backfill_features stores the current ones).
+        """
+        features = decode_features(self.taste_features)
+        if features is None:
+            features = compute_features(*self.with_imported_tastes(self.artist_records(), self.genre_names()))
+        return features
 
-    user.access_token = token_info["access_token"]
-    user.expires_at = datetime.utcnow() + timedelta(seconds=3600)
-    db.session.commit()
 
-    return user.access_token
+class SyncJob(db.Model):
+    """
+    Pending re-sync of one user's listening data, processed by the background worker.
+    At most one row per user; finished jobs are deleted.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    spotify_id = db.Column(db.String(80), unique=True, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="pending", index=True)  # pending | running | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    claimed_by = db.Column(db.String(64), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SyncJob {self.spotify_id} {self.status}>"
@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from backend.http_cache import PAYLOAD_VERSION
+from backend.serialization import dumps, loads
+
+
+class MemoryStore:
+    """In-process LRU store. Values are kept as Python objects (no serialization cost)."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+
+class DiskStore:
+    """SQLite-file store, shared by every worker process on the host and surviving restarts."""
+
+    def __init__(self, path, maxsize=100000):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_used ON cache (used)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        return loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires, used) VALUES (?, ?, ?, ?)",
+            (key, dumps(value), now + ttl, now),
+        )
+        # Evict the least recently written rows once over the limit
+        conn.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+
+    def delete_prefix(self, prefix):
+        self._connect().execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+
+class RedisStore:
+    """Adapter for any Redis-compatible client (redis-py, fakeredis, ...) exposing get/setex/scan_iter/delete."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return loads(raw) if raw else None
+
+    def set(self, key, value, ttl):
+        # Keep entries past their freshness TTL so the ETag can still be revalidated
+        self.client.setex(key, int(ttl * 10), dumps(value))
+
+    def delete_prefix(self, prefix):
+        for key in self.client.scan_iter(f"{prefix}*"):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    """
+    Per-user cache of Spotify proxy payloads.
+
+    Entries are {"data", "etag", "fetched_at"}. An entry younger than `ttl` is served as is;
+    an older one is revalidated with If-None-Match, so an unchanged upstream costs a 304
+    instead of a full payload plus a database write.
+    """
+
+    def __init__(self, store, ttl=300):
+        self.store = store
+        self.ttl = ttl
+        self._lock = threading.Lock()  # Guards the counters
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(spotify_id, endpoint, time_range):
+        # Versioned: a shared store outlives deploys, and entries hold payloads in the trimmed record shape
+        return f"v{PAYLOAD_VERSION}:{spotify_id}:{endpoint}:{time_range or 'medium_term'}"
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry["fetched_at"] < self.ttl
+
+    def put(self, key, data, etag=None):
+        entry = {"data": data, "etag": etag, "fetched_at": time.time()}
+        self.store.set(key, entry, self.ttl)
+        return entry
+
+    def touch(self, key, entry):
+        """Upstream confirmed the entry is unchanged (304): restart its freshness window."""
+        return self.put(key, entry["data"], entry["etag"])
+
+    def invalidate_user(self, spotify_id):
+        self.store.delete_prefix(f"v{PAYLOAD_VERSION}:{spotify_id}:")
+
+    def count(self, outcome):
+        """Count one lookup: 'hits', 'revalidated' or 'misses'."""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
+
+
+def build_response_cache(config):
+    """Pick the store configured by RESPONSE_CACHE_BACKEND ('memory' or 'disk')."""
+    if config.RESPONSE_CACHE_BACKEND == "disk":
+        store = DiskStore(config.RESPONSE_CACHE_PATH, config.RESPONSE_CACHE_SIZE)
+    else:
+        store = MemoryStore(config.RESPONSE_CACHE_SIZE)
+    return ResponseCache(store, config.RESPONSE_CACHE_TTL)
@@ -0,0 +1,176 @@
+"""
+JSON encoding for stored profile snapshots, cached Spotify payloads and API responses.
+
+Uses orjson, else msgspec, when installed (JSON_BACKEND picks one explicitly) and the standard
+library otherwise. All three write the same compact UTF-8 JSON for strings, integers, lists and
+dicts (everything stored snapshots hold), so a snapshot written under one backend compares equal
+to the same data encoded by another. They differ only in how floats are written in exponent
+notation, and in datetimes: msgspec writes ISO 8601, the others use HTTP dates as Flask does.
+
+Also defines the artist/track records that are stored and served: Spotify objects trimmed to
+what comparisons and the frontend read (name, genres, one image URL, the Spotify link).
+"""
+import json
+from typing import TypedDict
+
+from flask.json.provider import DefaultJSONProvider
+
+from backend.config import Config
+
+_flask_default = DefaultJSONProvider.default  # HTTP dates, dataclasses, UUID, Decimal, __html__
+
+
+def _stdlib():
+    encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=_flask_default)
+    canonical = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, sort_keys=True, default=_flask_default)
+    return {
+        "dumps": encoder.encode,
+        "dumps_bytes": lambda value: encoder.encode(value).encode("utf-8"),
+        "canonical_dumps": canonical.encode,
+        "loads": json.loads,
+        "errors": (ValueError,),
+    }
+
+
+def _orjson():
+    import orjson
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+    canonical_options = options | orjson.OPT_SORT_KEYS
+    return {
+        "dumps": lambda value: orjson.dumps(value, _flask_default, options).decode("utf-8"),
+        "dumps_bytes": lambda value: orjson.dumps(value, _flask_default, options),
+        "canonical_dumps": lambda value: orjson.dumps(value, _flask_default, canonical_options).decode("utf-8"),
+        "loads": orjson.loads,
+        "errors": (orjson.JSONDecodeError,),
+    }
+
+
+def _msgspec():
+    import msgspec
+
+    encoder = msgspec.json.Encoder(enc_hook=_flask_default)
+    canonical = msgspec.json.Encoder(enc_hook=_flask_default, order="sorted")
+    decoder = msgspec.json.Decoder()
+    return {
+        "dumps": lambda value: encoder.encode(value).decode("utf-8"),
+        "dumps_bytes": encoder.encode,
+        "canonical_dumps": lambda value: canonical.encode(value).decode("utf-8"),
+        "loads": decoder.decode,
+        "errors": (msgspec.DecodeError, ValueError),
+    }
+
+
+BACKENDS = {"orjson": _orjson, "msgspec": _msgspec, "json": _stdlib}
+
+
+def select_backend(name):
+    """Resolve JSON_BACKEND: 'auto' takes the first of orjson, msgspec, json that imports."""
+    for candidate in (("orjson", "msgspec", "json") if name == "auto" else (name,)):
+        try:
+            return candidate, BACKENDS[candidate]()
+        except ImportError:
+            if name != "auto":
+                raise
+    raise ValueError(f"Unknown JSON_BACKEND {name!r}")
+
+
+BACKEND, _codec = select_backend(Config.JSON_BACKEND)
+
+dumps = _codec["dumps"]  # value → compact JSON str
+dumps_bytes = _codec["dumps_bytes"]  # value → compact UTF-8 JSON bytes (response bodies)
+canonical_dumps = _codec["canonical_dumps"]  # value → compact JSON str with sorted keys (stored snapshots)
+loads = _codec["loads"]  # str or bytes → value
+DecodeError = _codec["errors"]  # Exception types raised by loads on malformed input
+
+
+class RawJSON(str):
+    """Text that already is JSON (e.g. a stored snapshot column), sent as is instead of decoded and re-encoded."""
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider (`jsonify`, `request.get_json`) backed by the selected backend."""
+
+    sort_keys = False  # Payloads are built in a fixed order, so output (and ETags) is stable without sorting
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:  # Explicit stdlib options (indent, ...): leave them to the default provider
+            return super().dumps(obj, **kwargs)
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)  # Indented output for debugging
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+
+# ---------- artist / track records ----------
+
+class Image(TypedDict):
+    url: str
+
+
+class ArtistRef(TypedDict):
+    name: str
+
+
+class ArtistRecord(TypedDict):
+    id: str  # Spotify ID, the Artist row key
+    name: str
+    genres: list[str]
+    images: list[Image]  # The first (largest) image only; the dashboard shows images[0]
+    external_urls: dict[str, str]  # {"spotify": url}
+
+
+class TrackRecord(TypedDict):
+    id: str  # Spotify ID (the URI for local files, which have none), the Track row key
+    name: str
+    artists: list[ArtistRef]
+    external_urls: dict[str, str]
+
+
+def _spotify_url(item):
+    url = (item.get("external_urls") or {}).get("spotify")
+    return {"spotify": url} if url else {}
+
+
+def artist_record(item) -> ArtistRecord:
+    """A Spotify artist object trimmed to the stored/served fields."""
+    images = item.get("images") or []
+    return {
+        "id": item["id"],
+        "name": item["name"],
+        "genres": item.get("genres", []),
+        "images": [{"url": images[0]["url"]}] if images else [],
+        "external_urls": _spotify_url(item),
+    }
+
+
+def track_record(item) -> TrackRecord:
+    """A Spotify track object trimmed to its ID, name, artist names and link."""
+    return {
+        "id": item.get("id") or item["uri"],
+        "name": item["name"],
+        "artists": [{"name": artist["name"]} for artist in item.get("artists", [])],
+        "external_urls": _spotify_url(item),
+    }
+
+
+RECORD_BUILDERS = {"me/top/artists": artist_record, "me/top/tracks": track_record}
+
+
+def trim_payload(endpoint, data):
+    """
+    A Spotify paging payload reduced to {"items": records} for the endpoints proxied to the
+    frontend; other payloads are returned unchanged. Cached and served in this form.
+    """
+    build = RECORD_BUILDERS.get(endpoint)
+    if build is None:
+        return data
+    return {"items": [build(item) for item in data.get("items", [])]}
@@ -0,0 +1,209 @@
+import hashlib
+import math
+import threading
+import time
+import numpy as np
+
+from backend.config import Config
+
+INITIAL_CAPACITY = 1024  # Rows allocated up front; the matrix doubles when full
+INITIAL_GENRE_COLUMNS = 32  # Main genres fit comfortably; grows if unmapped genres show up
+IDF_DECIMALS = 2  # IDF weights are rounded, so their version only moves when the population really shifts
+
+
+class IdfTable:
+    """
+    Smoothed IDF of every mapped genre at one point in time. `version` hashes the weights, so
+    processes holding the same population agree on it and results scored with this table can
+    be cached (and validated) under it.
+    """
+
+    def __init__(self, weights, unseen):
+        self.weights = weights  # genre → IDF, for genres some user has
+        self.unseen = unseen  # IDF of a genre no user has
+        self.version = hashlib.blake2b(repr((sorted(weights.items()), unseen)).encode(), digest_size=8).hexdigest()
+
+    def __call__(self, genre):
+        return self.weights.get(genre, self.unseen)
+
+
+class TasteMatrix:
+    """
+    In-memory one-to-many similarity engine.
+
+    Every user is a binary vector over [main genres | artist names]:
+    - the genre block is a dense float32 matrix (few columns, many rows)
+    - the artist block is kept as inverted postings (artist → row ids) because it is very sparse
+    Cosine similarity of one user against all others is then a single mat-vec product
+    plus a scatter-add over the postings of the query's artists.
+    """
+
+    def __init__(self, idf_refresh_interval=60):
+        self._lock = threading.RLock()
+        self.loaded = False
+        self.idf_refresh_interval = idf_refresh_interval
+        self._idf = None  # IdfTable in use until _idf_expires (monotonic)
+        self._idf_expires = 0.0
+        self._reset()
+
+    def _reset(self):
+        self.genre_columns = {}  # main genre → column index
+        self.genres = np.zeros((INITIAL_CAPACITY, INITIAL_GENRE_COLUMNS), dtype=np.float32)
+        self.norms = np.zeros(INITIAL_CAPACITY, dtype=np.float32)  # sqrt(#genres + #artists) per row
+        self.genre_df = np.zeros(INITIAL_GENRE_COLUMNS, dtype=np.float32)  # users per genre (column sums)
+        self.row_of = {}  # spotify_id → row
+        self.ids = []  # row → spotify_id
+        self.row_artists = []  # row → frozenset of artist names
+        self.artist_postings = {}  # artist name → set of rows
+
+    # ---------- building ----------
+
+    def load(self, rows):
+        """Rebuild the whole matrix from an iterable of (spotify_id, genres, artists)."""
+        with self._lock:
+            self._reset()
+            for spotify_id, genres, artists in rows:
+                self._upsert(spotify_id, genres, artists)
+            self._idf = None
+            self.loaded = True
+
+    def size(self):
+        """Number of users in the matrix."""
+        return len(self.ids)
+
+    def upsert(self, spotify_id, genres, artists):
+        """Insert or replace a single user's row (called whenever their tastes are rewritten)."""
+        with self._lock:
+            self._upsert(spotify_id, genres, artists)
+
+    def _upsert(self, spotify_id, genres, artists):
+        row = self.row_of.get(spotify_id)
+        if row is None:
+            row = len(self.ids)
+            self._ensure_rows(row + 1)
+            self.row_of[spotify_id] = row
+            self.ids.append(spotify_id)
+            self.row_artists.append(frozenset())
+
+        # Genre block (document frequencies are kept in step so IDF never needs a table scan)
+        self.genre_df -= self.genres[row]
+        self.genres[row, :] = 0.0
+        for genre in genres:
+            self.genres[row, self._genre_column(genre)] = 1.0
+        self.genre_df += self.genres[row]
+
+        # Artist block: drop the old postings, add the new ones
+        for artist in self.row_artists[row]:
+            self.artist_postings[artist].discard(row)
+        artists = frozenset(artists)
+        for artist in artists:
+            self.artist_postings.setdefault(artist, set()).add(row)
+        self.row_artists[row] = artists
+
+        self.norms[row] = np.sqrt(len(set(genres)) + len(artists))
+
+    def _ensure_rows(self, needed):
+        capacity = self.genres.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        genres = np.zeros((new_capacity, self.genres.shape[1]), dtype=np.float32)
+        genres[:capacity] = self.genres
+        norms = np.zeros(new_capacity, dtype=np.float32)
+        norms[:capacity] = self.norms
+        self.genres, self.norms = genres, norms
+
+    def _genre_column(self, genre):
+        column = self.genre_columns.get(genre)
+        if column is None:
+            column = len(self.genre_columns)
+            if column >= self.genres.shape[1]:
+                widened = np.zeros((self.genres.shape[0], self.genres.shape[1] * 2), dtype=np.float32)
+                widened[:, :self.genres.shape[1]] = self.genres
+                self.genres = widened
+                self.genre_df = np.concatenate([self.genre_df, np.zeros_like(self.genre_df)])
+            self.genre_columns[genre] = column
+        return column
+
+    # ---------- querying ----------
+
+    def idf_table(self):
+        """
+        Smoothed inverse document frequencies across the whole population, recomputed at most
+        every idf_refresh_interval seconds: upserts in between don't change weighted scores.
+        """
+        now = time.monotonic()
+        table = self._idf
+        if table is not None and now < self._idf_expires:
+            return table
+        with self._lock:
+            if self._idf is None or now >= self._idf_expires:
+                users = len(self.ids)
+                self._idf = IdfTable(
+                    {
+                        genre: round(math.log((1 + users) / (1 + float(self.genre_df[column]))) + 1.0, IDF_DECIMALS)
+                        for genre, column in self.genre_columns.items()
+                        if self.genre_df[column] > 0  # Columns left over from rewritten users count as unseen
+                    },
+                    round(math.log(1 + users) + 1.0, IDF_DECIMALS),
+                )
+                self._idf_expires = now + self.idf_refresh_interval
+            return self._idf
+
+    def idf(self, genre):
+        """IDF of one mapped genre, from the current idf_table()."""
+        return self.idf_table()(genre)
+
+    def scores_for(self, spotify_id):
+        """Cosine similarity of one user against every row (the user's own row is set to -1)."""
+        with self._lock:
+            row = self.row_of.get(spotify_id)
+            if row is None:
+                return None
+            n = len(self.ids)
+            dots = self.genres[:n] @ self.genres[row]
+
+            postings = [
+                np.fromiter(self.artist_postings[artist], dtype=np.int64)
+                for artist in self.row_artists[row]
+            ]
+            if postings:
+                np.add.at(dots, np.concatenate(postings), 1.0)
+
+            denom = self.norms[:n] * self.norms[row]
+            scores = np.divide(dots, denom, out=np.zeros(n, dtype=np.float32), where=denom > 0)
+            scores[row] = -1.0
+            return scores
+
+    def scores_among(self, spotify_id, candidate_ids):
+        """Exact cosine similarity of one user against a candidate subset only (used to re-rank ANN hits)."""
+        with self._lock:
+            row = self.row_of.get(spotify_id)
+            if row is None:
+                return None
+            rows = np.fromiter(
+                (self.row_of[c] for c in candidate_ids if c in self.row_of and c != spotify_id),
+                dtype=np.int64,
+            )
+            dots = self.genres[rows] @ self.genres[row]
+            artists = self.row_artists[row]
+            dots += np.fromiter((len(artists & self.row_artists[r]) for r in rows), dtype=np.float32, count=len(rows))
+            denom = self.norms[rows] * self.norms[row]
+            scores = np.divide(dots, denom, out=np.zeros(len(rows), dtype=np.float32), where=denom > 0)
+            return [(self.ids[r], float(s)) for r, s in zip(rows, scores)]
+
+    def top_k(self, spotify_id, k=20):
+        """Return [(spotify_id, similarity)] for the k most similar users, best first."""
+        scores = self.scores_for(spotify_id)
+        if scores is None:
+            return None
+        k = min(k, len(scores) - 1)
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.ids[i], float(scores[i])) for i in best]
+
+
+# Shared per-process instance, filled lazily on the first /matches request
+taste_index = TasteMatrix(Config.IDF_REFRESH_INTERVAL)
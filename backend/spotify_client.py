@@ -0,0 +1,158 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import has_request_context
+from requests.adapters import HTTPAdapter
+
+from backend.config import Config
+from backend.instrumentation import upstream_requests, upstream_retries, upstream_seconds
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SpotifyClient:
+    """
+    The single way the backend talks to Spotify.
+
+    - one keep-alive `requests.Session` with a connection pool sized to `max_concurrency`
+    - a semaphore bounding in-flight calls across all threads
+    - retries on connection errors, 429 and 5xx with exponential backoff + jitter,
+      honoring Spotify's `Retry-After` header when present; sleeps are capped at
+      `request_max_backoff` while an HTTP request waits on the call, `max_backoff` otherwise
+    - no retries for authorization_code grants: a code is single-use
+    - per-endpoint call/error/retry counters and latency histograms, exposed at /metrics
+    """
+
+    def __init__(self, token_url, api_base_url, client_id, client_secret,
+                 timeout=(3.05, 10), max_concurrency=16, max_retries=3,
+                 backoff_base=0.5, max_backoff=30, request_max_backoff=2):
+        self.token_url = token_url
+        self.api_base_url = api_base_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.request_max_backoff = request_max_backoff
+        self.max_concurrency = max_concurrency
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="spotify")
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            token_url=config.SPOTIFY_TOKEN_URL,
+            api_base_url=config.SPOTIFY_API_BASE_URL,
+            client_id=config.SPOTIFY_CLIENT_ID,
+            client_secret=config.SPOTIFY_CLIENT_SECRET,
+            timeout=config.SPOTIFY_TIMEOUT,
+            max_concurrency=config.SPOTIFY_MAX_WORKERS,
+            max_retries=config.SPOTIFY_MAX_RETRIES,
+            request_max_backoff=config.SPOTIFY_REQUEST_MAX_BACKOFF,
+        )
+
+    # ---------- public API ----------
+
+    def get(self, path, access_token, params=None, headers=None, max_backoff=None):
+        """GET a Web API path (e.g. 'me/top/artists') as the given user."""
+        all_headers = {"Authorization": f"Bearer {access_token}", **(headers or {})}
+        return self._request("GET", path.split("?", 1)[0], f"{self.api_base_url}{path}",
+                             max_backoff=max_backoff, params=params, headers=all_headers)
+
+    def get_async(self, path, access_token, params=None, headers=None):
+        """Same as get() but returns a Future, so independent calls can run concurrently."""
+        # The cap is chosen here: the pool thread running the call has no request context
+        return self._executor.submit(self.get, path, access_token, params, headers, self.backoff_cap())
+
+    def request_token(self, grant_type, **fields):
+        """POST to the accounts token endpoint (authorization_code or refresh_token grants)."""
+        data, max_retries = self.token_request_data(grant_type, **fields)
+        return self._request("POST", "token", self.token_url, max_retries=max_retries, data=data)
+
+    def backoff_cap(self):
+        """Longest retry sleep for a call made now: short while an HTTP request is waiting on it."""
+        return self.request_max_backoff if has_request_context() else self.max_backoff
+
+    def retry_delay(self, attempt, max_retries, max_backoff, response=None):
+        """
+        Seconds to wait before retrying a failed call (connection error, or `response` with a
+        retryable status), or None to give up: retries are used up, or Spotify's Retry-After
+        asks for longer than `max_backoff` (retrying sooner only earns another 429).
+        """
+        if attempt >= max_retries:
+            return None
+        retry_after = self._retry_after(response) if response is not None else None
+        if retry_after is not None and retry_after > max_backoff:
+            return None
+        return min(retry_after or self._backoff(attempt), max_backoff)
+
+    def token_request_data(self, grant_type, **fields):
+        """Form fields and retry budget for a token endpoint POST."""
+        data = {
+            "grant_type": grant_type,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            **fields,
+        }
+        # A retried authorization code was possibly consumed already, and only earns invalid_grant
+        max_retries = 0 if grant_type == "authorization_code" else self.max_retries
+        return data, max_retries
+
+    def record_call(self, endpoint, seconds, error):
+        """Count one finished call (sync or async client) in the /metrics counters and histograms."""
+        upstream_seconds.observe(seconds, endpoint)
+        upstream_requests.inc(endpoint, "error" if error else "ok")
+
+    def record_retry(self, endpoint):
+        upstream_retries.inc(endpoint)
+
+    # ---------- internals ----------
+
+    def _request(self, method, endpoint, url, max_retries=None, max_backoff=None, **kwargs):
+        max_retries = self.max_retries if max_retries is None else max_retries
+        max_backoff = self.backoff_cap() if max_backoff is None else max_backoff
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                with self._slots:
+                    response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except requests.exceptions.RequestException:
+                self.record_call(endpoint, time.perf_counter() - started, error=True)
+                delay = self.retry_delay(attempt, max_retries, max_backoff)
+                if delay is None:
+                    raise
+            else:
+                self.record_call(endpoint, time.perf_counter() - started, error=response.status_code >= 400)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = self.retry_delay(attempt, max_retries, max_backoff, response)
+                if delay is None:
+                    return response
+
+            attempt += 1
+            self.record_retry(endpoint)
+            time.sleep(delay)
+
+    def _backoff(self, attempt):
+        return self.backoff_base * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.headers.get("Retry-After", ""))
+        except ValueError:
+            return None
+
+
+# Shared client used by every route
+spotify = SpotifyClient.from_config(Config)
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from backend.extensions import db
+from backend.models import SyncJob, User
+
+
+def enqueue_sync(spotify_id, delay=0):
+    """Queue a background refresh of the user's listening data (no-op if one is already queued)."""
+    existing = SyncJob.query.filter_by(spotify_id=spotify_id).first()
+    if existing:
+        if existing.status != "failed":
+            return False
+        existing.status, existing.attempts, existing.run_after = "pending", 0, datetime.utcnow()
+        db.session.commit()
+        return True
+    db.session.add(SyncJob(spotify_id=spotify_id, run_after=datetime.utcnow() + timedelta(seconds=delay)))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # Another request queued the same user first
+        return False
+    return True
+
+
+def enqueue_stale_users(max_age, limit=500):
+    """Queue users whose snapshot is older than max_age seconds; returns how many were added."""
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    queued = db.session.query(SyncJob.spotify_id)
+    stale = (
+        User.query.with_entities(User.spotify_id)
+        .filter(User.refresh_token.isnot(None))
+        .filter((User.synced_at.is_(None)) | (User.synced_at < cutoff))
+        .filter(User.spotify_id.notin_(queued))
+        .order_by(User.synced_at)
+        .limit(limit)
+        .all()
+    )
+    now = datetime.utcnow()
+    db.session.add_all(SyncJob(spotify_id=row.spotify_id, run_after=now) for row in stale)
+    db.session.commit()
+    return len(stale)
+
+
+def claim_batch(worker_id, size):
+    """Atomically mark up to `size` due jobs as running for this worker and return them."""
+    now = datetime.utcnow()
+    due = (
+        db.session.query(SyncJob.id)
+        .filter(SyncJob.status == "pending", SyncJob.run_after <= now)
+        .order_by(SyncJob.run_after)
+        .limit(size)
+        .scalar_subquery()
+    )
+    SyncJob.query.filter(SyncJob.id.in_(due), SyncJob.status == "pending").update(
+        {"status": "running", "claimed_by": worker_id, "claimed_at": now}, synchronize_session=False
+    )
+    db.session.commit()
+    return SyncJob.query.filter_by(status="running", claimed_by=worker_id).all()
+
+
+def complete(job):
+    db.session.delete(job)
+    db.session.commit()
+
+
+def fail(job, error, max_attempts=5):
+    """Retry with exponential backoff, giving up after max_attempts."""
+    job.attempts += 1
+    job.last_error = str(error)[:1000]
+    job.claimed_by = None
+    if job.attempts >= max_attempts:
+        job.status = "failed"
+    else:
+        job.status = "pending"
+        job.run_after = datetime.utcnow() + timedelta(seconds=30 * 2 ** job.attempts)
+    db.session.commit()
+
+
+def release_stuck(older_than=600):
+    """Return jobs left 'running' by a crashed worker to the queue."""
+    cutoff = datetime.utcnow() - timedelta(seconds=older_than)
+    SyncJob.query.filter(SyncJob.status == "running", SyncJob.claimed_at < cutoff).update(
+        {"status": "pending", "claimed_by": None}, synchronize_session=False
+    )
+    db.session.commit()
@@ -0,0 +1,93 @@
+import os
+import socket
+import time
+
+import click
+import requests
+from flask.cli import AppGroup
+from sqlalchemy.exc import SQLAlchemyError
+
+from backend.auth_routes import fetch_taste_snapshot, response_cache
+from backend.config import Config
+from backend.extensions import db
+from backend.genre_taxonomy import reload_if_changed
+from backend.instrumentation import logger, record_error
+from backend.models import User
+from backend.sync_queue import claim_batch, complete, enqueue_stale_users, fail, release_stuck
+from backend.token_manager import token_manager, TokenRefreshError
+from backend.user_comparison import backfill_features, refresh_user_in_index
+
+CALLS_PER_SYNC = 2  # top artists + top tracks
+
+sync_cli = AppGroup("sync", help="Background re-sync of users' listening data.")
+
+
+def sync_user(user):
+    """Re-fetch one user's snapshot from Spotify and store it (same data as a fresh login)."""
+    access_token = token_manager.access_token(user)
+    top_artists, top_genres, top_tracks = fetch_taste_snapshot(access_token)
+    if user.update_listening_data(top_artists, top_tracks, top_genres):
+        refresh_user_in_index(user)
+    response_cache.invalidate_user(user.spotify_id)
+
+
+def store_taxonomy_features():
+    """Persist taste features recomputed with the loaded taxonomy, so web workers stop recomputing them on read."""
+    updated = backfill_features()
+    if updated:
+        logger.info("Stored taste features of %d users for the current genre taxonomy", updated)
+
+
+def run_worker(batch_size, rate_limit, poll_interval, stale_after, once=False):
+    """
+    Claim due jobs in batches and sync them, pacing Spotify calls to `rate_limit` per second.
+    Every empty poll also sweeps for stale users, so snapshots age out even without traffic.
+    Features built with another taxonomy are stored anew at startup and after every reload.
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    min_interval = CALLS_PER_SYNC / rate_limit if rate_limit > 0 else 0
+    release_stuck()
+    store_taxonomy_features()  # The taxonomy may have changed while no worker was running
+
+    while True:
+        # Long-running: pick up taxonomy edits like the web workers do
+        if Config.TAXONOMY_RELOAD_INTERVAL > 0 and reload_if_changed():
+            store_taxonomy_features()
+        jobs = claim_batch(worker_id, batch_size)
+        if not jobs:
+            queued = enqueue_stale_users(stale_after, limit=batch_size * 10)
+            if once and not queued:
+                return
+            if not queued:
+                time.sleep(poll_interval)
+            continue
+
+        for job in jobs:
+            started = time.monotonic()
+            user = User.query.filter_by(spotify_id=job.spotify_id).first()
+            try:
+                if user:
+                    sync_user(user)
+                complete(job)
+            except (requests.exceptions.RequestException, TokenRefreshError, SQLAlchemyError, KeyError, ValueError) as error:
+                db.session.rollback()  # Drop a half-written snapshot (or a failed transaction) before recording the failure
+                record_error("sync_worker", f"{job.spotify_id}: {error}")
+                fail(job, error)
+            time.sleep(max(0.0, min_interval - (time.monotonic() - started)))
+
+
+@sync_cli.command("worker")
+@click.option("--batch-size", default=Config.SYNC_BATCH_SIZE, show_default=True)
+@click.option("--rate", default=Config.SYNC_RATE_LIMIT, show_default=True, help="Spotify requests per second.")
+@click.option("--stale-after", default=Config.SYNC_STALE_AFTER, show_default=True, help="Seconds.")
+@click.option("--once", is_flag=True, help="Drain the queue and stale users, then exit.")
+def worker_command(batch_size, rate, stale_after, once):
+    """Run the sync worker: `flask sync worker`."""
+    run_worker(batch_size, rate, Config.SYNC_POLL_INTERVAL, stale_after, once)
+
+
+@sync_cli.command("enqueue-stale")
+@click.option("--stale-after", default=Config.SYNC_STALE_AFTER, show_default=True, help="Seconds.")
+def enqueue_stale_command(stale_after):
+    """Queue every user whose snapshot is older than --stale-after."""
+    print(f"Queued {enqueue_stale_users(stale_after, limit=100000)} users")
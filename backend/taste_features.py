@@ -0,0 +1,113 @@
+import json
+import struct
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from backend.genre_taxonomy import map_to_main_genre, taxonomy
+from backend.instrumentation import timed
+from backend.serialization import loads
+
+FEATURES_VERSION = 2  # Bump when the stored layout or the genre mapping changes, so old blobs are recomputed
+
+# Dense vocabulary: the taxonomy's main genres, in file order (taxonomy().main_genres). Genres
+# that don't map to one (Spotify genres outside the taxonomy) are carried separately as
+# `extra_genres`. Blobs record the vocabulary's tag, so a reloaded taxonomy with other main
+# genres makes decode_features reject them and they get recomputed.
+
+# version, vocabulary tag, vocabulary size, vector norm
+_HEADER = struct.Struct("<BIHf")
+
+TasteFeatures = namedtuple(
+    "TasteFeatures",
+    [
+        "genre_weights",  # float32[len(main_genres)]: how many of the user's sub-genres map to each main genre
+        "extra_genres",  # frozenset of mapped genres outside the vocabulary
+        "norm",  # L2 norm of the binary mapped-genre membership vector
+        "sub_genres",  # raw Spotify genres, in rank order
+        "artists",  # artist names, in rank order
+        "artists_by_genre",  # mapped genre → artist names
+    ],
+)
+
+
+@timed("compute_features")
+def compute_features(artists, genres):
+    """Derive a user's comparison features from their top artists (dicts with name/genres) and top genres."""
+    vocabulary = taxonomy()
+    weights = np.zeros(len(vocabulary.main_genres), dtype=np.float32)
+    extra = set()
+    for genre in genres:
+        main = map_to_main_genre(genre)
+        index = vocabulary.main_genre_index.get(main)
+        if index is None:
+            extra.add(main)
+        else:
+            weights[index] += 1.0
+
+    artists_by_genre = {}
+    for artist in artists:
+        for genre in artist.get("genres", []):
+            names = artists_by_genre.setdefault(map_to_main_genre(genre), [])
+            if artist["name"] not in names:
+                names.append(artist["name"])
+
+    membership = int(np.count_nonzero(weights)) + len(extra)
+    return TasteFeatures(
+        genre_weights=weights,
+        extra_genres=frozenset(extra),
+        norm=float(np.sqrt(membership)),
+        sub_genres=list(dict.fromkeys(genres)),
+        artists=list(dict.fromkeys(a["name"] for a in artists)),
+        artists_by_genre=artists_by_genre,
+    )
+
+
+def encode_features(features):
+    """Pack features as: header | float32 weight vector | zlib(JSON of the variable-length parts)."""
+    variable = {
+        "extra_genres": sorted(features.extra_genres),
+        "sub_genres": features.sub_genres,
+        "artists": features.artists,
+        "artists_by_genre": features.artists_by_genre,
+    }
+    return (
+        _HEADER.pack(FEATURES_VERSION, taxonomy().vocabulary_tag, len(features.genre_weights), features.norm)
+        + features.genre_weights.astype("<f4").tobytes()
+        # stdlib on purpose: these bytes define taste_version, which must not depend on JSON_BACKEND
+        + zlib.compress(json.dumps(variable, separators=(",", ":")).encode("utf-8"))
+    )
+
+
+def decode_features(blob):
+    """Unpack a blob from encode_features, or return None if it is missing or was built for another version/vocabulary."""
+    if not blob or len(blob) < _HEADER.size:
+        return None
+    version, vocabulary_tag, size, norm = _HEADER.unpack_from(blob)
+    vocabulary = taxonomy()
+    if version != FEATURES_VERSION or vocabulary_tag != vocabulary.vocabulary_tag or size != len(vocabulary.main_genres):
+        return None
+    offset = _HEADER.size + 4 * size
+    weights = np.frombuffer(blob, dtype="<f4", count=size, offset=_HEADER.size)
+    variable = loads(zlib.decompress(blob[offset:]))
+    return TasteFeatures(
+        genre_weights=weights,
+        extra_genres=frozenset(variable["extra_genres"]),
+        norm=norm,
+        sub_genres=variable["sub_genres"],
+        artists=variable["artists"],
+        artists_by_genre=variable["artists_by_genre"],
+    )
+
+
+def mapped_genres(features):
+    """The set of mapped genres a user has (main genres with non-zero weight plus extras)."""
+    main_genres = taxonomy().main_genres
+    return {main_genres[i] for i in np.flatnonzero(features.genre_weights)} | features.extra_genres
+
+
+def genre_overlap(features1, features2):
+    """Number of mapped genres two users share: a dot product over the dense block plus a small set intersection."""
+    dense = int(np.count_nonzero((features1.genre_weights > 0) & (features2.genre_weights > 0)))
+    return dense + len(features1.extra_genres & features2.extra_genres)
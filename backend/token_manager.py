@@ -0,0 +1,202 @@
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+
+import requests
+from flask import current_app
+
+from backend.config import Config
+from backend.extensions import db
+from backend.instrumentation import record_error
+from backend.models import User
+from backend.spotify_client import spotify
+
+
+class TokenRefreshError(Exception):
+    """Spotify refused (or never answered) a refresh_token grant."""
+
+
+class TokenManager:
+    """
+    The one place Spotify access tokens are refreshed.
+
+    - single-flight: concurrent requests for the same user share one refresh call
+    - tokens are treated as expired `skew` seconds early, so a token never dies mid-request
+    - a background thread renews tokens of recently active users `lead` seconds before
+      `User.expires_at`, so most requests never refresh inline
+    - the real `expires_in` (and a rotated refresh_token, if Spotify sends one) is stored
+    """
+
+    def __init__(self, client, skew=60, lead=300, interval=60, active_window=1800, reuse_window=30):
+        self.client = client
+        self.skew = skew
+        self.lead = lead
+        self.interval = interval
+        self.active_window = active_window
+        self.reuse_window = reuse_window
+
+        self._lock = threading.Lock()
+        self._inflight = {}  # spotify_id → Future of token_info
+        self._recent = {}  # spotify_id → (token_info, obtained_at) for late followers
+        self._active = {}  # spotify_id → last time one of their requests needed a token
+        self._scheduler = None
+        self._counters = {
+            "refreshes": 0, "failures": 0, "coalesced": 0, "proactive": 0, "total_seconds": 0.0,
+        }
+
+    # ---------- request path ----------
+
+    def access_token(self, user):
+        """Return a valid access token for the user, refreshing it (once, shared) if needed."""
+        with self._lock:  # The refresher thread prunes _active concurrently
+            self._active[user.spotify_id] = time.time()
+        self.ensure_scheduler()
+        if user.expires_at - datetime.utcnow() > timedelta(seconds=self.skew):
+            return user.access_token
+        # The row may come from the hot-user cache: another process could have renewed it already
+        db.session.refresh(user)
+        if user.expires_at - datetime.utcnow() > timedelta(seconds=self.skew):
+            return user.access_token
+        self.refresh(user)
+        return user.access_token
+
+    def refresh(self, user, proactive=False):
+        """Refresh the user's token through the single-flight gate and persist it."""
+        if not user.refresh_token:
+            raise TokenRefreshError("No refresh token available")
+
+        token_info, leader = self._single_flight(user.spotify_id, user.refresh_token)
+        self._apply(user, token_info)
+        if leader:
+            db.session.commit()
+            if proactive:
+                self._count("proactive")
+
+    def _single_flight(self, spotify_id, refresh_token):
+        with self._lock:
+            recent = self._recent.get(spotify_id)
+            if recent and time.time() - recent[1] < self.reuse_window:
+                self._counters["coalesced"] += 1
+                return recent[0], False
+            future = self._inflight.get(spotify_id)
+            leader = future is None
+            if leader:
+                future = self._inflight[spotify_id] = Future()
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            try:
+                return future.result(timeout=30), False
+            except FutureTimeoutError as error:
+                self._count("failures")
+                raise TokenRefreshError("Timed out waiting for a concurrent token refresh") from error
+
+        try:
+            token_info = self._request_refresh(refresh_token)
+            future.set_result(token_info)
+            with self._lock:
+                self._recent[spotify_id] = (token_info, time.time())
+            return token_info, True
+        except Exception as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(spotify_id, None)
+
+    def _request_refresh(self, refresh_token):
+        started = time.perf_counter()
+        try:
+            response = self.client.request_token("refresh_token", refresh_token=refresh_token)
+            token_info = response.json()
+        except (requests.exceptions.RequestException, ValueError) as error:
+            self._count("failures")
+            raise TokenRefreshError("Failed to refresh access token") from error
+        finally:
+            self._count("total_seconds", time.perf_counter() - started)
+
+        if "access_token" not in token_info:
+            self._count("failures")
+            raise TokenRefreshError("Failed to refresh access token")
+        self._count("refreshes")
+        return token_info
+
+    @staticmethod
+    def _apply(user, token_info):
+        user.access_token = token_info["access_token"]
+        user.expires_at = datetime.utcnow() + timedelta(seconds=token_info.get("expires_in", 3600))
+        if token_info.get("refresh_token"):
+            user.refresh_token = token_info["refresh_token"]
+
+    # ---------- background renewal ----------
+
+    def ensure_scheduler(self):
+        """Start the renewal thread on first use (after any pre-fork, so each worker gets its own)."""
+        if self.interval <= 0 or self._scheduler is not None:
+            return
+        with self._lock:
+            if self._scheduler is None:
+                app = current_app._get_current_object()
+                self._scheduler = threading.Thread(
+                    target=self._run, args=(app,), name="token-renewal", daemon=True
+                )
+                self._scheduler.start()
+
+    def _run(self, app):
+        while True:
+            time.sleep(self.interval)
+            with app.app_context():
+                try:
+                    self.refresh_due()
+                except Exception as error:
+                    record_error("token_renewal", error)
+                finally:
+                    db.session.remove()
+
+    def refresh_due(self):
+        """Renew tokens of recently active users that expire within `lead` seconds."""
+        now = time.time()
+        with self._lock:
+            for spotify_id, seen in list(self._active.items()):
+                if seen < now - self.active_window:
+                    del self._active[spotify_id]
+            for spotify_id, (_, at) in list(self._recent.items()):
+                if now - at >= self.reuse_window:
+                    del self._recent[spotify_id]
+            active = list(self._active)
+        if not active:
+            return
+
+        due = User.query.filter(
+            User.spotify_id.in_(active),
+            User.refresh_token.isnot(None),
+            User.expires_at < datetime.utcnow() + timedelta(seconds=self.lead),
+        ).all()
+        for user in due:
+            try:
+                self.refresh(user, proactive=True)
+            except TokenRefreshError as error:
+                record_error("token_renewal", f"{user.spotify_id}: {error}")
+
+    # ---------- metrics ----------
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        attempts = stats["refreshes"] + stats["failures"]
+        stats["avg_ms"] = round(stats["total_seconds"] * 1000 / attempts, 2) if attempts else 0.0
+        return stats
+
+
+token_manager = TokenManager(
+    spotify,
+    skew=Config.TOKEN_REFRESH_SKEW,
+    lead=Config.TOKEN_REFRESH_LEAD,
+    interval=Config.TOKEN_REFRESH_INTERVAL,
+)
@@ -1,110 +1,272 @@
-from flask import Blueprint, jsonify, request
-import json
-from backend.models import User
+from flask import Blueprint, jsonify, request, current_app, Response
+import numpy as np
 import os
+import threading
+import time
+from datetime import datetime, timedelta
+from backend.models import User, UserGenre, Genre
+from backend.genre_taxonomy import taxonomy
+from backend.similarity_engine import taste_index
+from backend.ann_index import ann_index, taste_features
+from backend.taste_features import decode_features, mapped_genres, genre_overlap
+from backend.extensions import db
+from backend.comparison_cache import ComparisonCache, taste_key
+from backend.config import Config
+from backend.user_loader import load_users
+from backend.listening_history import history_similarity
+from backend.instrumentation import logger, metrics, record_error, timed
+from backend.serialization import DecodeError, dumps, loads
+from backend.http_cache import strong_etag, validated
 import math
 
 comparison = Blueprint("comparison", __name__)
 
-# Load sub-genre-to-main-genre mapping
-current_dir = os.path.dirname(__file__)
-json_path = os.path.join(current_dir, "categorized-subset.json")
-with open(json_path, "r") as f:
-    GENRE_MAPPING = json.load(f)
+MAX_GROUP_SIZE = 50
+GENRE_SCORE_WEIGHT = 0.7  # Weighted scoring: share of the genre cosine vs. the artist Jaccard component
+HISTORY_SCORE_WEIGHT = 0.3  # History scoring: share of the play-history cosine vs. the weighted score
 
+comparison_cache = ComparisonCache(Config.COMPARISON_CACHE_SIZE)
+metrics.register_stats("comparison_cache", "Comparison result cache counters.", comparison_cache.stats)
+
+@timed("safe_json_loads")
 def safe_json_loads(data):
     """Load JSON safely from a stringified object in the DB."""
     if not data:
         return []
     try:
-        return json.loads(data)
-    except json.JSONDecodeError:
-        print(f"Failed to decode JSON: {data}")
+        return loads(data)
+    except DecodeError:
+        record_error("safe_json_loads", f"failed to decode JSON: {data[:200]}")
         return []
 
-def map_to_main_genre(sub_genre):
-    """Maps a given sub-genre to a main genre from the JSON mapping."""
-    sub_genre = sub_genre.lower()
-    for main_genre, sub_genres in GENRE_MAPPING.items():
-        if sub_genre in [g.lower() for g in sub_genres]:
-            return main_genre.lower()
-    return sub_genre
-
-def cosine_similarity(vec1, vec2):
-    """Standard cosine similarity calculation."""
-    dot_product = sum(a * b for a, b in zip(vec1, vec2))
-    norm_a = math.sqrt(sum(a * a for a in vec1))
-    norm_b = math.sqrt(sum(b * b for b in vec2))
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    return dot_product / (norm_a * norm_b)
-
-def organize_artists_by_genre(artists):
-    """
-    From list of artist objects, return a dictionary of genre → [artist dicts]
-    """
-    genre_to_artists = {}
-    for artist in artists:
-        for genre in artist.get("genres", []):
-            genre = map_to_main_genre(genre)
-            genre_to_artists.setdefault(genre, []).append(artist)
-    return genre_to_artists
+def user_taste_features(user):
+    """Mapped main genres and artist names used by the one-to-many similarity engine."""
+    features = user.features()
+    return mapped_genres(features), set(features.artists)
+
+def stored_tastes(batch_size=1000):
+    """
+    (spotify_id, mapped genres, artist names) of every user, streamed from just the spotify_id
+    and packed taste_features columns rather than whole rows. Users whose features are missing
+    or built for another taxonomy (until backfill_features stores them) are loaded afterwards,
+    a batch at a time, and recomputed.
+    """
+    stale = []
+    rows = db.session.query(User.spotify_id, User.taste_features).execution_options(yield_per=batch_size)
+    for spotify_id, blob in rows:
+        features = decode_features(blob)
+        if features is None:
+            stale.append(spotify_id)
+        else:
+            yield spotify_id, mapped_genres(features), set(features.artists)
+    for start in range(0, len(stale), batch_size):
+        for user in User.query.filter(User.spotify_id.in_(stale[start:start + batch_size])):
+            yield (user.spotify_id, *user_taste_features(user))
+
+class IndexCatchUp:
+    """
+    Keeps one in-memory index current with tastes other processes write (the sync worker, other
+    gunicorn workers): at most every TASTE_INDEX_REFRESH_INTERVAL seconds, users whose
+    taste_changed_at passed the watermark are applied to the index again.
+
+    The query reaches CATCH_UP_SLACK behind the watermark, since a write stamped earlier can
+    commit after one stamped later (and clocks of other hosts drift); re-applying a user is harmless.
+    """
+
+    CATCH_UP_SLACK = timedelta(seconds=60)
+
+    def __init__(self, apply):
+        self.apply = apply  # Called with the changed users
+        self.watermark = None  # Newest taste_changed_at the index reflects
+        self.next_check = 0.0
+        self._lock = threading.Lock()
+
+    def start(self, watermark):
+        """The index was just (re)loaded and reflects every change up to `watermark`."""
+        with self._lock:
+            self.watermark = watermark
+            self.next_check = time.monotonic() + Config.TASTE_INDEX_REFRESH_INTERVAL
+
+    def check(self, force=False):
+        """Apply the users changed since the watermark, if the interval has passed (or `force`)."""
+        interval = Config.TASTE_INDEX_REFRESH_INTERVAL
+        now = time.monotonic()
+        if not force and (interval <= 0 or now < self.next_check):
+            return
+        with self._lock:
+            if not force and now < self.next_check:
+                return  # Another thread is catching up
+            self.next_check = now + interval
+            since = self.watermark
+        query = User.query.filter(User.taste_changed_at.isnot(None))
+        if since is not None:
+            query = query.filter(User.taste_changed_at > since - self.CATCH_UP_SLACK)
+        users = query.all()
+        if not users:
+            return
+        self.apply(users)
+        newest = max(user.taste_changed_at for user in users)
+        with self._lock:
+            if self.watermark is None or newest > self.watermark:
+                self.watermark = newest
+
+
+def newest_taste_change():
+    """The latest taste_changed_at in the User table (None when no tastes are stored)."""
+    return db.session.query(db.func.max(User.taste_changed_at)).scalar()
+
+def _catch_up_taste_index(users):
+    for user in users:
+        taste_index.upsert(user.spotify_id, *user_taste_features(user))
+
+def _catch_up_ann_index(users):
+    for user in users:
+        ann_index.upsert(user.spotify_id, taste_features(*user_taste_features(user)))
+
+taste_index_catch_up = IndexCatchUp(_catch_up_taste_index)
+ann_index_catch_up = IndexCatchUp(_catch_up_ann_index)
+
+def load_taste_index():
+    """
+    Fill the in-memory similarity matrix from the User table once per process, then keep it caught up.
+    Under gunicorn the master loads it before forking (backend.wsgi), so workers, including the ones
+    max_requests recycles, start with it and only catch up.
+    """
+    if taste_index.loaded:
+        taste_index_catch_up.check()
+        return
+    watermark = newest_taste_change()  # Taken first: changes written during the load are applied again
+    taste_index.load(stored_tastes())
+    taste_index_catch_up.start(watermark)
+
+def ann_index_path():
+    """The ANN index is persisted next to the SQLite database in the instance folder."""
+    return os.path.join(current_app.instance_path, "ann_index.npz")
+
+def build_ann_index():
+    """Recompute every MinHash signature from the User table and persist it."""
+    watermark = newest_taste_change()
+    ann_index.load(
+        (spotify_id, taste_features(genres, artists)) for spotify_id, genres, artists in stored_tastes()
+    )
+    ann_index_catch_up.start(watermark)
+    os.makedirs(current_app.instance_path, exist_ok=True)
+    ann_index.save(ann_index_path())
+
+def load_ann_index():
+    """Load the persisted ANN index (building it on first use if no file exists yet), then keep it caught up."""
+    if ann_index.loaded:
+        ann_index_catch_up.check()
+        return
+    path = ann_index_path()
+    if os.path.exists(path):
+        saved_at = datetime.utcfromtimestamp(os.path.getmtime(path))
+        ann_index.load_file(path)
+        ann_index_catch_up.start(saved_at)
+        ann_index_catch_up.check(force=True)  # What changed since the file was written
+    else:
+        build_ann_index()
+
+def refresh_user_in_index(user):
+    """Keep the similarity matrix and ANN index in sync after a user's tastes are rewritten."""
+    comparison_cache.invalidate_user(user.spotify_id)
+    genres, artists = user_taste_features(user)
+    if taste_index.loaded:
+        taste_index.upsert(user.spotify_id, genres, artists)
+    if ann_index.loaded:
+        ann_index.upsert(user.spotify_id, taste_features(genres, artists))
+        ann_index.save_if_due(ann_index_path())
+
+def approximate_top_k(spotify_id, k, probes=None):
+    """ANN candidates from MinHash LSH, re-ranked with exact cosine similarity."""
+    load_taste_index()
+    load_ann_index()
+    scored = taste_index.scores_among(spotify_id, ann_index.candidates(spotify_id, probes))
+    if scored is None:
+        return None
+    return sorted(scored, key=lambda match: match[1], reverse=True)[:k]
 
 def merge_user_data(user1, user2):
-    """Main logic: compares, maps, and recommends artists."""
+    """Main logic: compares, maps, and recommends artists (from each user's precomputed features)."""
 
-    # 🎧 Load top genres & artists
-    genres_1 = set(safe_json_loads(user1.top_genres))
-    genres_2 = set(safe_json_loads(user2.top_genres))
-    user1_artists = safe_json_loads(user1.top_artists)
-    user2_artists = safe_json_loads(user2.top_artists)
+    # 🎧 Load precomputed features (mapped genres, artist buckets, norms)
+    f1 = user1.features()
+    f2 = user2.features()
 
     # 📚 All genres and mapped versions
-    all_subgenres = list(genres_1 | genres_2)
-    mapped_genres = set(map_to_main_genre(g) for g in all_subgenres)
-    user1_mapped = set(map_to_main_genre(g) for g in genres_1)
-    user2_mapped = set(map_to_main_genre(g) for g in genres_2)
+    all_subgenres = list(dict.fromkeys(f1.sub_genres + f2.sub_genres))
+    user1_mapped = mapped_genres(f1)
+    user2_mapped = mapped_genres(f2)
+    all_genres = sorted(user1_mapped | user2_mapped)  # Sorted: same bytes in every process, so ETags stay strong
 
     shared_genres = user1_mapped & user2_mapped
-    print("Shared Genres:", shared_genres)
-
-    # 🎨 Organize each user's artists by genre
-    u1_by_genre = organize_artists_by_genre(user1_artists)
-    u2_by_genre = organize_artists_by_genre(user2_artists)
+    logger.debug("Shared genres: %s", shared_genres)
 
     # 🎯 Recommendation logic
     user1_recommended = set()
     user2_recommended = set()
 
     for genre in shared_genres:
-        u1_artists_in_genre = {a["name"] for a in u1_by_genre.get(genre, [])}
-        u2_artists_in_genre = {a["name"] for a in u2_by_genre.get(genre, [])}
+        u1_artists_in_genre = f1.artists_by_genre.get(genre, [])
+        u2_artists_in_genre = f2.artists_by_genre.get(genre, [])
 
         # Recommend artists user2 knows but user1 doesn't
-        user1_recommended.update(
-            a["name"] for a in u2_by_genre.get(genre, [])
-            if a["name"] not in u1_artists_in_genre
-        )
+        user1_recommended.update(set(u2_artists_in_genre).difference(u1_artists_in_genre))
 
         # Recommend artists user1 knows but user2 doesn't
-        user2_recommended.update(
-            a["name"] for a in u1_by_genre.get(genre, [])
-            if a["name"] not in u2_artists_in_genre
-        )
+        user2_recommended.update(set(u1_artists_in_genre).difference(u2_artists_in_genre))
 
-    # 🧮 Vectors for cosine similarity
-    all_genres = list(mapped_genres)
+    # 🧮 Binary genre vectors; cosine comes straight from the overlap and the stored norms
     u1_vector = [1 if g in user1_mapped else 0 for g in all_genres]
     u2_vector = [1 if g in user2_mapped else 0 for g in all_genres]
+    denominator = f1.norm * f2.norm
 
     return {
         "merged_sub_genres": all_subgenres,
-        "merged_genres": list(mapped_genres),
+        "merged_genres": all_genres,
         "user1_vector": u1_vector,
         "user2_vector": u2_vector,
-        "cosine_similarity": cosine_similarity(u1_vector, u2_vector),
-        "user1_recommended_artists": list(user1_recommended),
-        "user2_recommended_artists": list(user2_recommended),
+        "cosine_similarity": genre_overlap(f1, f2) / denominator if denominator else 0.0,
+        "user1_recommended_artists": sorted(user1_recommended),
+        "user2_recommended_artists": sorted(user2_recommended),
+    }
+
+def rank_weighted_genres(features, idf):
+    """
+    Genre weights from artist rank: the artist at rank r contributes 1 / (r + 1) to each of its
+    mapped genres, and every genre is scaled by its population IDF so ubiquitous genres like
+    "pop" count for less than niche ones.
+    """
+    rank = {name: r for r, name in enumerate(features.artists)}
+    return {
+        genre: idf(genre) * sum(1.0 / (rank[name] + 1) for name in names if name in rank)
+        for genre, names in features.artists_by_genre.items()
+    }
+
+def population_idf():
+    """The IDF snapshot weighted and history scores use (population statistics live in the similarity matrix)."""
+    load_taste_index()
+    return taste_index.idf_table()
+
+def weighted_similarity(user1, user2, idf=None):
+    """Rank- and IDF-weighted genre cosine blended with the artist-overlap Jaccard index."""
+    idf = idf or population_idf()
+    f1, f2 = user1.features(), user2.features()
+    w1 = rank_weighted_genres(f1, idf)
+    w2 = rank_weighted_genres(f2, idf)
+
+    dot = sum(weight * w2[genre] for genre, weight in w1.items() if genre in w2)
+    norm = math.sqrt(sum(v * v for v in w1.values())) * math.sqrt(sum(v * v for v in w2.values()))
+    genre_similarity = dot / norm if norm else 0.0
+
+    artists1, artists2 = set(f1.artists), set(f2.artists)
+    union = artists1 | artists2
+    artist_jaccard = len(artists1 & artists2) / len(union) if union else 0.0
+
+    return {
+        "genre_similarity": genre_similarity,
+        "artist_jaccard": artist_jaccard,
+        "score": GENRE_SCORE_WEIGHT * genre_similarity + (1 - GENRE_SCORE_WEIGHT) * artist_jaccard,
     }
 
 @comparison.route("/compare-users", methods=["GET"])
@@ -116,10 +278,226 @@ def compare_users():
     if not user1_id or not user2_id:
         return jsonify({"error": "Missing user IDs"}), 400
 
-    user1 = User.query.filter_by(spotify_id=user1_id).first()
-    user2 = User.query.filter_by(spotify_id=user2_id).first()
+    users = load_users([user1_id, user2_id])  # One query for the pair (none when both are hot)
+    user1 = users.get(user1_id)
+    user2 = users.get(user2_id)
 
     if not user1 or not user2:
         return jsonify({"error": "User not found"}), 404
 
-    return jsonify(merge_user_data(user1, user2))
+    scoring = request.args.get("scoring", "binary")
+    if scoring not in ("binary", "weighted", "history"):
+        return jsonify({"error": "scoring must be 'binary', 'weighted' or 'history'"}), 400
+
+    # The IDF is taken once: the result is cached under the version it was scored with
+    idf = population_idf() if scoring in ("weighted", "history") else None
+    generation = idf.version if idf else None
+    return validated(comparison_etag(user1, user2, scoring, generation), lambda: jsonify(comparison_cache.get_or_compute(
+        user1, user2, scoring, lambda a, b: compare_pair(a, b, scoring, idf), generation
+    )))
+
+def comparison_etag(user1, user2, scoring, generation=None):
+    """
+    ETag of a /compare-users payload: it changes only with either user's tastes and the
+    `generation` of the population statistics it was scored with, i.e. the IDF version for
+    weighted and history scoring (None until both users have features).
+    """
+    if user1.taste_version is None or user2.taste_version is None:
+        return None
+    return strong_etag(
+        "compare-users", scoring, generation,
+        user1.spotify_id, taste_key(user1, scoring), user2.spotify_id, taste_key(user2, scoring),
+    )
+
+def compare_pair(user1, user2, scoring, idf=None):
+    """Full /compare-users payload for one pair under the given scoring mode (weighted parts use `idf`, if given)."""
+    result = merge_user_data(user1, user2)
+    result["scoring"] = scoring
+    if scoring in ("weighted", "history"):
+        weighted = weighted_similarity(user1, user2, idf)
+        result.update(
+            genre_similarity=weighted["genre_similarity"],
+            artist_jaccard=weighted["artist_jaccard"],
+            cosine_similarity=weighted["score"],
+        )
+    if scoring == "history":
+        # Blend in what both users actually played; without history on both sides it's the weighted score
+        history = history_similarity(user1, user2)
+        result["history_similarity"] = history
+        if history is not None:
+            result["cosine_similarity"] = (1 - HISTORY_SCORE_WEIGHT) * weighted["score"] + HISTORY_SCORE_WEIGHT * history
+    return result
+
+def group_comparison(users):
+    """
+    Compare N users in one pass:
+    - a binary membership matrix over [main genres | extra genres] gives the full cosine
+      matrix as one matrix product divided by the outer product of the stored norms
+    - group-wide shared genres are the columns every member has
+    - each member is recommended other members' artists in genres they have too
+    """
+    features = [user.features() for user in users]
+    main_genres = taxonomy().main_genres
+    extras = sorted(set().union(*(f.extra_genres for f in features)))
+    extra_index = {genre: i for i, genre in enumerate(extras)}
+
+    membership = np.zeros((len(users), len(main_genres) + len(extras)), dtype=np.float32)
+    for row, f in enumerate(features):
+        membership[row, :len(main_genres)] = f.genre_weights > 0
+        for genre in f.extra_genres:
+            membership[row, len(main_genres) + extra_index[genre]] = 1.0
+
+    norms = np.array([f.norm for f in features], dtype=np.float32)
+    denom = np.outer(norms, norms)
+    similarity = np.divide(membership @ membership.T, denom, out=np.zeros_like(denom), where=denom > 0)
+
+    vocabulary = main_genres + extras
+    shared_genres = [vocabulary[i] for i in np.flatnonzero(membership.all(axis=0))]
+
+    recommendations = {}
+    for row, (user, f) in enumerate(zip(users, features)):
+        known = set(f.artists)
+        recommended = {}
+        for column in np.flatnonzero(membership[row]):
+            genre = vocabulary[column]
+            for other in features:
+                if other is f:
+                    continue
+                for name in other.artists_by_genre.get(genre, []):
+                    if name not in known:
+                        recommended[name] = None
+        recommendations[user.spotify_id] = list(recommended)
+
+    return similarity, shared_genres, recommendations
+
+@comparison.route("/compare-group", methods=["GET"])
+def compare_group():
+    """Compare a whole group (users=id1,id2,...) at once and stream the result."""
+    user_ids = list(dict.fromkeys(u for u in request.args.get("users", "").split(",") if u))
+    if len(user_ids) < 2:
+        return jsonify({"error": "Provide at least two comma-separated user IDs"}), 400
+    if len(user_ids) > MAX_GROUP_SIZE:
+        return jsonify({"error": f"At most {MAX_GROUP_SIZE} users per group"}), 400
+
+    found = load_users(user_ids)
+    missing = [u for u in user_ids if u not in found]
+    if missing:
+        return jsonify({"error": "User not found", "missing": missing}), 404
+
+    users = [found[u] for u in user_ids]
+    etag = None
+    if all(user.taste_version is not None for user in users):
+        etag = strong_etag("compare-group", [(user.spotify_id, user.taste_version) for user in users])
+    return validated(etag, lambda: stream_group_comparison(users))
+
+def stream_group_comparison(users):
+    """The /compare-group payload, written out row by row."""
+    user_ids = [user.spotify_id for user in users]
+    similarity, shared_genres, recommendations = group_comparison(users)
+
+    def generate():
+        yield '{"members":' + dumps(user_ids)
+        yield ',"shared_genres":' + dumps(shared_genres)
+        yield ',"similarity_matrix":['
+        for row, values in enumerate(similarity.tolist()):
+            yield ("," if row else "") + dumps([round(v, 6) for v in values])
+        yield '],"recommendations":{'
+        for n, (spotify_id, artists) in enumerate(recommendations.items()):
+            yield ("," if n else "") + dumps(spotify_id) + ":" + dumps(artists)
+        yield "}}"
+
+    return Response(generate(), mimetype="application/json")
+
+@comparison.route("/matches", methods=["GET"])
+def matches():
+    """
+    Score one user against every other user and return the k most similar. mode=approximate uses
+    the ANN index once the population reaches ANN_MIN_USERS; `mode` in the response says which ran.
+    `taste_similarity` is
+    the cosine over main genres and artist names together (the similarity matrix), unlike
+    /compare-users' genre-only `cosine_similarity`, so the two differ for the same pair.
+    """
+    spotify_id = request.args.get("spotify_id")
+    if not spotify_id:
+        return jsonify({"error": "Missing spotify_id"}), 400
+
+    try:
+        k = max(1, min(int(request.args.get("k", 20)), 100))
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+
+    mode = request.args.get("mode", "exact")
+    if mode not in ("exact", "approximate"):
+        return jsonify({"error": "mode must be 'exact' or 'approximate'"}), 400
+
+    load_taste_index()
+    if mode == "approximate" and taste_index.size() >= Config.ANN_MIN_USERS:
+        results = approximate_top_k(spotify_id, k, request.args.get("probes", type=int))
+    else:
+        mode = "exact"  # Below ANN_MIN_USERS exact scoring is both faster and complete
+        results = taste_index.top_k(spotify_id, k)
+
+    if results is None:
+        return jsonify({"error": "User not found"}), 404
+
+    return jsonify({
+        "spotify_id": spotify_id,
+        "mode": mode,
+        "matches": [
+            {"spotify_id": match_id, "taste_similarity": score}
+            for match_id, score in results
+        ],
+    })
+
+
+@comparison.route("/users-by-genre", methods=["GET"])
+def users_by_genre():
+    """List users who have a given Spotify genre in their top genres (indexed join, no JSON decoding)."""
+    genre = request.args.get("genre")
+    if not genre:
+        return jsonify({"error": "Missing genre"}), 400
+
+    try:
+        limit = max(1, min(int(request.args.get("limit", 50)), 500))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    rows = (
+        User.query.with_entities(User.spotify_id)
+        .join(UserGenre, UserGenre.user_id == User.id)
+        .join(Genre, Genre.id == UserGenre.genre_id)
+        .filter(Genre.name == genre.lower())
+        .order_by(UserGenre.rank)
+        .limit(limit)
+        .all()
+    )
+    return jsonify({"genre": genre.lower(), "users": [row.spotify_id for row in rows]})
+
+
+@comparison.cli.command("build-ann-index")
+def build_ann_index_command():
+    """Rebuild the persisted ANN index from scratch: `flask comparison build-ann-index`."""
+    build_ann_index()
+    print(f"ANN index built for {len(ann_index.signatures)} users → {ann_index_path()}")
+
+
+def backfill_features(batch_size=500):
+    """
+    Recompute every user's packed features with the current taxonomy and store the ones that
+    changed (missing, built for another taxonomy or mapped differently), committing per batch.
+    Their new taste_changed_at brings every process's indexes up to date. Returns how many changed.
+    """
+    updated, last_id = 0, 0
+    while True:
+        users = User.query.filter(User.id > last_id).order_by(User.id).limit(batch_size).all()
+        if not users:
+            return updated
+        updated += sum(user.refresh_features() for user in users)
+        db.session.commit()
+        last_id = users[-1].id
+
+
+@comparison.cli.command("backfill-features")
+def backfill_features_command():
+    """Store packed taste features for users missing them or built with another taxonomy."""
+    print(f"Backfilled taste features for {backfill_features()} users")
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from backend.config import Config
+from backend.extensions import db
+from backend.models import User
+
+USER_COLUMNS = [column.key for column in User.__table__.columns]
+
+
+class HotUserCache:
+    """
+    Cross-request LRU of recently loaded users, keyed by spotify_id.
+
+    Entries are detached column snapshots, never the instances a request works with: a hit is
+    merged into the current session without a SELECT, so each request still gets its own copy.
+    Any flush that inserts, updates or deletes a user drops that user's entry in this process;
+    `ttl` bounds how long a write made by another process (gunicorn worker, sync worker) can go unseen.
+    """
+
+    def __init__(self, maxsize=1000, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # spotify_id → (snapshot, cached_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, spotify_id):
+        with self._lock:
+            entry = self._data.get(spotify_id)
+            if entry is None or time.monotonic() - entry[1] >= self.ttl:
+                self.misses += 1
+                return None
+            self._data.move_to_end(spotify_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user):
+        if self.maxsize <= 0:
+            return
+        snapshot = User(**{key: getattr(user, key) for key in USER_COLUMNS})
+        make_transient_to_detached(snapshot)
+        with self._lock:
+            self._data[user.spotify_id] = (snapshot, time.monotonic())
+            self._data.move_to_end(user.spotify_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, spotify_id):
+        with self._lock:
+            if self._data.pop(spotify_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data), "hits": self.hits, "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+hot_users = HotUserCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL)
+
+
+@event.listens_for(Session, "after_flush")
+def invalidate_written_users(session, flush_context):
+    """Drop users written by this flush from the hot cache (in this process)."""
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, User) and instance.spotify_id:
+            hot_users.invalidate(instance.spotify_id)
+
+
+def load_users(spotify_ids):
+    """
+    Return {spotify_id: User} for the ids that exist, loading all misses in one IN query.
+
+    Users are cached on `flask.g` for the rest of the request, so helpers can call this again
+    without another query, and in the cross-request `hot_users` LRU.
+    """
+    loaded = g.setdefault("users_by_spotify_id", {})
+    missing = []
+    for spotify_id in dict.fromkeys(spotify_ids):
+        if spotify_id in loaded:
+            continue
+        snapshot = hot_users.get(spotify_id)
+        if snapshot is not None:
+            loaded[spotify_id] = db.session.merge(snapshot, load=False)
+        else:
+            missing.append(spotify_id)
+
+    if missing:
+        found = {user.spotify_id: user for user in User.query.filter(User.spotify_id.in_(missing))}
+        for spotify_id in missing:
+            loaded[spotify_id] = found.get(spotify_id)  # None is remembered too: unknown ids are asked once
+            if spotify_id in found:
+                hot_users.put(found[spotify_id])
+
+    return {spotify_id: loaded[spotify_id] for spotify_id in spotify_ids if loaded.get(spotify_id) is not None}
+
+
+def load_user(spotify_id):
+    """The User with this spotify_id, or None (see load_users)."""
+    return load_users([spotify_id]).get(spotify_id)
+
+
+def remember_user(user):
+    """Make a user created during this request visible to later load_user calls."""
+    g.setdefault("users_by_spotify_id", {})[user.spotify_id] = user
@@ -0,0 +1,41 @@
+"""
+Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py backend.wsgi:app
+
+Importing this module builds the app and warms everything that is read-only and safe to
+share between pre-forked workers (genre taxonomy index, model metadata, Jinja/JSON setup,
+the similarity matrix /matches and weighted scoring use), so each worker starts serving
+immediately and shares those pages copy-on-write. Loading the matrix reads two columns of
+every user; workers then only catch up with changes made since. Nothing here touches the
+database schema.
+
+Everything alive after the warm-up is then frozen out of the garbage collector: collections
+in the workers would otherwise write to every tracked object's header and copy the pages.
+"""
+import gc
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from backend import create_app
+from backend.genre_taxonomy import map_to_main_genre
+from backend.instrumentation import record_error
+from backend.models import User
+from backend.user_comparison import load_taste_index
+
+app = create_app()
+
+
+def warm_up():
+    """Exercise import-time caches once in the master process before fork."""
+    map_to_main_genre("warm up")  # Loads the taxonomy (compiled artifact when current)
+    with app.app_context():
+        User.__table__.c.keys()
+        try:
+            load_taste_index()
+        except SQLAlchemyError as error:  # e.g. not initialized yet: workers load it on first use
+            record_error("warm_up", error)
+    gc.freeze()
+
+
+warm_up()
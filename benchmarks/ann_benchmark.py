@@ -0,0 +1,76 @@
+"""
+Exact vs. approximate friend matching.
+
+    python -m benchmarks.ann_benchmark --users 100000 --queries 200 --k 20
+
+Builds a synthetic population directly into the in-memory engines (no database),
+then reports build time, mean query latency and recall@k of MinHash LSH against
+exact scoring for a grid of band layouts and probe counts. ann_index's default layout and
+ANN_MIN_USERS (the population from which /matches routes approximate queries to the index)
+come from these numbers: set ANN_MIN_USERS where an LSH row beats the exact query time at a
+recall you accept.
+"""
+import argparse
+import random
+import time
+
+from backend.ann_index import MinHashLSH, taste_features
+from backend.genre_taxonomy import taxonomy
+from backend.similarity_engine import TasteMatrix
+
+
+def synthetic_users(n, seed=7):
+    """Users with 1-3 favourite main genres and artists drawn mostly from those genres."""
+    rnd = random.Random(seed)
+    main_genres = taxonomy().main_genres
+    artists_by_genre = {g: [f"{g} artist {i}" for i in range(400)] for g in main_genres}
+    for i in range(n):
+        favourites = rnd.sample(main_genres, rnd.randint(1, 3))
+        artists = {rnd.choice(artists_by_genre[rnd.choice(favourites)]) for _ in range(10)}
+        yield f"user{i}", set(favourites), artists
+
+
+def run(users, queries, k, layouts, probe_grid):
+    population = list(synthetic_users(users))
+    query_ids = random.Random(1).sample([u[0] for u in population], queries)
+
+    exact = TasteMatrix()
+    started = time.perf_counter()
+    exact.load(population)
+    print(f"exact    build {time.perf_counter() - started:7.2f}s")
+
+    started = time.perf_counter()
+    truth = {q: {m for m, _ in exact.top_k(q, k)} for q in query_ids}
+    exact_ms = (time.perf_counter() - started) * 1000 / queries
+    print(f"exact    query {exact_ms:7.2f}ms  recall@{k} 1.000")
+
+    for bands, rows_per_band in layouts:
+        index = MinHashLSH(bands=bands, rows_per_band=rows_per_band)
+        started = time.perf_counter()
+        index.load((user_id, taste_features(g, a)) for user_id, g, a in population)
+        print(f"lsh {bands}x{rows_per_band} build {time.perf_counter() - started:7.2f}s")
+
+        for probes in probe_grid:
+            if probes > bands:
+                continue
+            hits, candidates = 0, 0
+            started = time.perf_counter()
+            for q in query_ids:
+                found = index.candidates(q, probes)
+                candidates += len(found)
+                ranked = sorted(exact.scores_among(q, found), key=lambda m: m[1], reverse=True)[:k]
+                hits += len(truth[q] & {m for m, _ in ranked})
+            ann_ms = (time.perf_counter() - started) * 1000 / queries
+            print(
+                f"lsh {bands}x{rows_per_band} probes={probes:<3} query {ann_ms:7.2f}ms  "
+                f"recall@{k} {hits / (k * queries):.3f}  candidates {candidates / queries:9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+    run(args.users, args.queries, args.k, layouts=[(16, 4), (32, 2), (64, 1)], probe_grid=[4, 8, 16, 32, 64])
@@ -0,0 +1,52 @@
+"""
+Login (OAuth callback) latency against a local fake Spotify server.
+
+    python -m benchmarks.callback_benchmark --latency 0.05 --logins 20
+
+With N upstream round-trips of latency L, a sequential callback costs about
+N*L; with the profile/top-artists/top-tracks calls issued concurrently it
+should cost about 2*L (token exchange + one parallel wave).
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.fake_spotify import fake_spotify
+
+
+def run(latency, logins):
+    with fake_spotify(latency) as server:
+        # Point the app at the fake server before anything reads Config
+        os.environ["SPOTIFY_TOKEN_URL"] = server.token_url
+        os.environ["SPOTIFY_API_BASE_URL"] = server.api_base_url
+
+        from backend.config import Config
+        Config.SQLALCHEMY_DATABASE_URI = "sqlite://"
+        from backend import create_app
+        from backend.extensions import db
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+        client = app.test_client()
+
+        timings = []
+        for n in range(logins):
+            started = time.perf_counter()
+            response = client.get(f"/callback?code=bench{n}")
+            timings.append(time.perf_counter() - started)
+            assert response.status_code == 302, response.get_data(as_text=True)
+
+    print(f"upstream latency  {latency * 1000:.0f}ms per call")
+    print(f"callback median   {statistics.median(timings) * 1000:.1f}ms")
+    print(f"callback p95      {sorted(timings)[int(len(timings) * 0.95) - 1] * 1000:.1f}ms")
+    print(f"upstream calls    {server.calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--logins", type=int, default=20)
+    args = parser.parse_args()
+    run(args.latency, args.logins)
@@ -0,0 +1,120 @@
+"""
+Concurrent login (OAuth callback) writes under different database settings.
+
+    python -m benchmarks.db_write_benchmark --logins 400 --concurrency 16 --workers 4 --threads 4
+    python -m benchmarks.db_write_benchmark --postgres-url postgresql://bench@localhost/bench_scratch
+
+Each setting gets a scratch database and a gunicorn server (WORKERS processes x THREADS
+threads) pointed at a local fake Spotify with no added latency, so the commit in /callback
+is what the logins contend on. Every login is run twice: first as a sign-up (inserts), then
+as a returning user (updates). Non-302 answers, e.g. "database is locked", count as errors.
+
+Settings:
+  sqlite-default  rollback journal, synchronous=FULL, no mmap (the driver's 5s busy timeout)
+  sqlite-wal      the app's defaults: WAL, synchronous=NORMAL, busy_timeout, mmap
+  postgres        only with --postgres-url (use an empty scratch database)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fake_spotify import fake_spotify
+from benchmarks.load_test import ROOT, free_port, wait_for
+
+SQLITE_SETTINGS = {
+    "sqlite-default": {
+        "SQLITE_JOURNAL_MODE": "delete", "SQLITE_SYNCHRONOUS": "full",
+        "SQLITE_BUSY_TIMEOUT": "5000", "SQLITE_MMAP_SIZE": "0",
+    },
+    "sqlite-wal": {},
+}
+
+
+def login_wave(base_url, codes, concurrency):
+    sessions = {}
+
+    def one(code):
+        session = sessions.setdefault(threading.get_ident(), requests.Session())
+        started = time.perf_counter()
+        response = session.get(f"{base_url}/callback", params={"code": code}, allow_redirects=False)
+        return time.perf_counter() - started, response.status_code == 302
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, codes))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(seconds for seconds, _ in results)
+    return {
+        "logins_per_second": round(len(codes) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        "errors": sum(1 for _, ok in results if not ok),
+    }
+
+
+def run_setting(name, database_url, overrides, server, args):
+    port = free_port()
+    env = {
+        **os.environ,
+        **overrides,
+        "DATABASE_URL": database_url,
+        "SPOTIFY_TOKEN_URL": server.token_url,
+        "SPOTIFY_API_BASE_URL": server.api_base_url,
+        "WEB_CONCURRENCY": str(args.workers),
+        "GUNICORN_THREADS": str(args.threads),
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        "GUNICORN_ACCESS_LOG": "",
+        "TOKEN_REFRESH_INTERVAL": "0",
+    }
+    subprocess.run(
+        [sys.executable, "-m", "flask", "--app", "backend.wsgi", "init-db"],
+        cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL,
+    )
+    gunicorn = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "backend.wsgi:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_for(base_url)
+        codes = [f"{name}-{n}" for n in range(args.logins)]
+        return {
+            "setting": name,
+            "signup": login_wave(base_url, codes, args.concurrency),
+            "relogin": login_wave(base_url, codes, args.concurrency),
+        }
+    finally:
+        gunicorn.terminate()
+        gunicorn.wait(timeout=30)
+
+
+def run(args):
+    results = []
+    with fake_spotify(latency=0) as server, tempfile.TemporaryDirectory() as scratch:
+        for name, overrides in SQLITE_SETTINGS.items():
+            database_url = f"sqlite:///{os.path.join(scratch, name + '.db')}"
+            results.append(run_setting(name, database_url, overrides, server, args))
+        if args.postgres_url:
+            results.append(run_setting("postgres", args.postgres_url, {}, server, args))
+
+    for result in results:
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--postgres-url", help="Also run against this (empty, scratch) PostgreSQL database")
+    run(parser.parse_args())
@@ -0,0 +1,217 @@
+"""
+Local stand-in for the Spotify accounts and Web API servers.
+
+    with fake_spotify(latency=0.05) as server:
+        os.environ["SPOTIFY_TOKEN_URL"] = server.token_url
+        os.environ["SPOTIFY_API_BASE_URL"] = server.api_base_url
+        ...
+
+Every request sleeps for `latency` seconds before answering, so the cost of
+sequential vs. concurrent upstream calls is visible from a local benchmark.
+The authorization code (and thus the access token) decides which fake user
+is returned, so many distinct users can log in against one server.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Read the taxonomy file directly: importing `backend` here would freeze Config before callers
+# get a chance to point SPOTIFY_TOKEN_URL / SPOTIFY_API_BASE_URL at this server
+TAXONOMY_PATH = os.path.join(os.path.dirname(__file__), "..", "backend", "categorized-subset.json")
+with open(TAXONOMY_PATH, "r") as f:
+    SUB_GENRES = sorted({g.lower() for sub_genres in json.load(f).values() for g in sub_genres})
+
+
+TOP_TOTAL = 99  # Spotify stops paging top items just short of 100
+SAVED_TOTAL = 300  # Saved tracks per fake user
+RECENT_TOTAL = 50  # Spotify only keeps the last 50 plays
+
+
+def fake_artist(n):
+    """Artist n, with the same genres for every user who has it."""
+    rnd = random.Random(f"artist:{n}")
+    return {
+        "id": f"artist{n}",
+        "name": f"Artist {n}",
+        "genres": rnd.sample(SUB_GENRES, 3),
+        "images": [{"url": f"https://i.scdn.co/image/{n}", "height": 640, "width": 640}],
+        "external_urls": {"spotify": f"https://open.spotify.com/artist/{n}"},
+        "popularity": rnd.randint(0, 100),
+    }
+
+
+def fake_track(n):
+    return {"id": f"track{n}", "name": f"Track {n}", "artists": [{"id": f"artist{n % 5000}", "name": f"Artist {n % 5000}"}]}
+
+
+def fake_artists(user_key, limit, offset=0, time_range="short_term"):
+    """Deterministic top artists for a user: same key → same payload, and pages of one ranking line up."""
+    ranking = random.Random(f"{user_key}:{time_range}").sample(range(5000), TOP_TOTAL)
+    return [fake_artist(n) for n in ranking[offset:offset + limit]]
+
+
+def fake_tracks(user_key, limit, offset=0, time_range="short_term"):
+    ranking = random.Random(f"tracks:{user_key}:{time_range}").sample(range(50000), TOP_TOTAL)
+    return [fake_track(n) for n in ranking[offset:offset + limit]]
+
+
+def fake_saved_tracks(user_key, limit, offset=0):
+    """Saved tracks, newest first, as {added_at, track} items."""
+    rnd = random.Random(f"saved:{user_key}")
+    library = rnd.sample(range(50000), SAVED_TOTAL)
+    return [
+        {"added_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1700000000 - i * 86400)), "track": fake_track(n)}
+        for i, n in enumerate(library[offset:offset + limit], start=offset)
+    ]
+
+
+def fake_plays(user_key, play_interval, now=None):
+    """The last RECENT_TOTAL plays, newest first: one every `play_interval` seconds, so new ones keep arriving."""
+    latest = int((now or time.time()) // play_interval)
+    plays = []
+    for slot in range(latest, latest - RECENT_TOTAL, -1):
+        n = random.Random(f"play:{user_key}:{slot}").randrange(50000)
+        played_ms = slot * play_interval * 1000
+        plays.append({
+            "track": fake_track(n),
+            "played_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(played_ms // 1000)) + f".{played_ms % 1000:03d}Z",
+            "_ms": played_ms,
+        })
+    return plays
+
+
+class FakeSpotifyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    disable_nagle_algorithm = True  # Headers and body are written separately; avoid delayed-ACK stalls
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _user_key(self):
+        return self.headers.get("Authorization", "").removeprefix("Bearer ").removeprefix("token-")
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        self.server.count("POST " + self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        if self.path != "/api/token":
+            return self._send({"error": "not found"}, 404)
+        key = (form.get("code") or form.get("refresh_token") or ["anonymous"])[0]
+        self._send({
+            "access_token": f"token-{key}",
+            "refresh_token": key,
+            "expires_in": 3600,
+            "token_type": "Bearer",
+        })
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        self.server.count("GET " + url.path)
+        query = parse_qs(url.query)
+        limit = int(query.get("limit", ["10"])[0])
+        key = self._user_key()
+
+        if url.path == "/v1/me":
+            return self._send({"id": f"user-{key}", "display_name": f"User {key}"})
+        offset = int(query.get("offset", ["0"])[0])
+        time_range = query.get("time_range", ["medium_term"])[0]
+        if url.path == "/v1/me/top/artists":
+            return self._send(self._page(fake_artists(key, limit, offset, time_range), TOP_TOTAL, limit, offset))
+        if url.path == "/v1/me/top/tracks":
+            return self._send(self._page(fake_tracks(key, limit, offset, time_range), TOP_TOTAL, limit, offset))
+        if url.path == "/v1/me/tracks":
+            return self._send(self._page(fake_saved_tracks(key, limit, offset), SAVED_TOTAL, limit, offset))
+        if url.path == "/v1/me/player/recently-played":
+            return self._send(self._recently_played(key, limit, query))
+        self._send({"error": "not found"}, 404)
+
+    def _page(self, items, total, limit, offset):
+        """Offset-paged payload shaped like Spotify's paging object."""
+        url = urlparse(self.path)
+        more = offset + limit < total
+        next_url = f"{self.server.api_base_url}{url.path.removeprefix('/v1/')}?limit={limit}&offset={offset + limit}"
+        return {"items": items, "total": total, "limit": limit, "offset": offset, "next": next_url if more else None}
+
+    def _recently_played(self, key, limit, query):
+        """Cursor-paged plays: `before`/`after` are unix milliseconds, like Spotify's."""
+        plays = fake_plays(key, self.server.play_interval)
+        if "after" in query:
+            plays = [p for p in plays if p["_ms"] > int(query["after"][0])][-limit:]
+        elif "before" in query:
+            plays = [p for p in plays if p["_ms"] < int(query["before"][0])][:limit]
+        else:
+            plays = plays[:limit]
+        cursors = {"after": str(plays[0]["_ms"]), "before": str(plays[-1]["_ms"])} if plays else None
+        next_url = (
+            f"{self.server.api_base_url}me/player/recently-played?limit={limit}&before={cursors['before']}"
+            if plays and len(plays) == limit else None
+        )
+        return {
+            "items": [{"track": p["track"], "played_at": p["played_at"]} for p in plays],
+            "cursors": cursors, "limit": limit, "next": next_url,
+        }
+
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Accept bursts of concurrent connections (async load tests)
+
+    def __init__(self, latency):
+        super().__init__(("127.0.0.1", 0), FakeSpotifyHandler)
+        self.latency = latency
+        self.play_interval = 180  # Seconds between fake plays in recently-played
+        self.calls = {}
+        self._calls_lock = threading.Lock()
+
+    def count(self, route):
+        with self._calls_lock:
+            self.calls[route] = self.calls.get(route, 0) + 1
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def token_url(self):
+        return f"{self.base_url}/api/token"
+
+    @property
+    def api_base_url(self):
+        return f"{self.base_url}/v1/"
+
+
+@contextmanager
+def fake_spotify(latency=0.05):
+    """Run a FakeSpotifyServer on a random local port for the duration of the block."""
+    server = FakeSpotifyServer(latency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,141 @@
+"""
+Throughput of /compare-users under gunicorn across worker/thread settings.
+
+    python -m benchmarks.load_test --users 2000 --requests 2000 --concurrency 16 \
+        --grid 1x1 2x1 2x4 4x4
+
+For each WORKERSxTHREADS setting a gunicorn server is started from gunicorn.conf.py
+against a scratch SQLite database seeded with synthetic users, hammered with random
+pairs, and stopped. Results are printed as one line per setting.
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed_database(database_url, users):
+    """Create the schema and `users` synthetic profiles in a scratch database."""
+    os.environ["DATABASE_URL"] = database_url
+    from backend import create_app
+    from backend.extensions import db
+    from backend.genre_taxonomy import taxonomy
+    from backend.models import User
+
+    sub_genres = sorted({g.lower() for values in taxonomy().mapping.values() for g in values})
+    rnd = random.Random(3)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        for n in range(users):
+            artists = [
+                {"id": f"artist{a}", "name": f"Artist {a}", "genres": rnd.sample(sub_genres, 3), "images": [], "external_urls": {}}
+                for a in rnd.sample(range(3000), 10)
+            ]
+            genres = list(dict.fromkeys(g for a in artists for g in a["genres"]))
+            user = User(spotify_id=f"user{n}", access_token="token", refresh_token="refresh")
+            db.session.add(user)
+            user.set_top_artists(artists, genres)
+            user.set_top_tracks([
+                {"id": f"track{t}", "name": f"Track {t}", "artists": [{"name": f"Artist {t % 3000}"}], "external_urls": {}}
+                for t in rnd.sample(range(30000), 10)
+            ])
+            if n % 500 == 0:
+                db.session.commit()
+        db.session.commit()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+def hammer(base_url, users, total, concurrency):
+    rnd = random.Random(11)
+    pairs = [tuple(rnd.sample(range(users), 2)) for _ in range(total)]
+    sessions = {}
+
+    def one(pair):
+        session = sessions.setdefault(threading.get_ident(), requests.Session())
+        started = time.perf_counter()
+        response = session.get(f"{base_url}/compare-users", params={"user1": f"user{pair[0]}", "user2": f"user{pair[1]}"})
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(one, pairs))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests_per_second": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+def run(users, total, concurrency, grid):
+    with tempfile.TemporaryDirectory() as scratch:
+        database_url = f"sqlite:///{os.path.join(scratch, 'load.db')}"
+        seed_database(database_url, users)
+
+        for setting in grid:
+            workers, threads = (int(v) for v in setting.split("x"))
+            port = free_port()
+            env = {
+                **os.environ,
+                "DATABASE_URL": database_url,
+                "WEB_CONCURRENCY": str(workers),
+                "GUNICORN_THREADS": str(threads),
+                "GUNICORN_BIND": f"127.0.0.1:{port}",
+                "GUNICORN_ACCESS_LOG": "",
+                "TOKEN_REFRESH_INTERVAL": "0",
+            }
+            server = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "backend.wsgi:app"],
+                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                wait_for(f"{base_url}/")
+                hammer(base_url, users, min(200, total), concurrency)  # warm caches and connections
+                result = hammer(base_url, users, total, concurrency)
+                print(json.dumps({"workers": workers, "threads": threads, **result}))
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--grid", nargs="+", default=["1x1", "2x1", "2x4", "4x4"])
+    args = parser.parse_args()
+    run(args.users, args.requests, args.concurrency, args.grid)
@@ -0,0 +1,180 @@
+"""
+Synthetic user population with realistic taste distributions, for benchmarks.
+
+    population = Population(users=100000, seed=42)
+    seed_database(app, population)          # bulk-load into the app's (scratch) database
+
+Genres come from the taxonomy (categorized-subset.json). Main genres, the sub-genres inside
+each one and the artists inside each main genre all follow Zipf-like popularity, so a few
+genres and artists are shared by many users and the long tail by few, as on Spotify:
+
+- every artist belongs to one main genre and has 1-4 of its sub-genres (sometimes one from
+  another main genre), the same for every user who has the artist
+- every user has 1-3 favourite main genres; ~85% of their top artists come from those,
+  the rest from anywhere; their top genres are their artists' genres in rank order, which
+  is how /callback derives them
+- a small share of genre strings is spelled the way Spotify does but the taxonomy doesn't
+  ("Hip-Hop", "nigerian afrobeats"), so the mapping fallback paths get exercised too
+
+The same (users, seed, artists) always yields the same population.
+"""
+import hashlib
+import itertools
+import json
+import random
+from datetime import datetime, timedelta
+
+from benchmarks.fake_spotify import TAXONOMY_PATH
+
+TOP_ARTISTS = 10  # Per user, as stored by /callback
+TOP_TRACKS = 10
+TRACKS_PER_ARTIST = 5
+INSERT_BATCH = 5000  # Users per bulk insert
+SPELLING_VARIANTS = 0.05  # Share of artist genres spelled differently from the taxonomy
+
+
+def zipf_cum_weights(n, exponent=1.0):
+    return list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(n)))
+
+
+class Population:
+    """A deterministic synthetic population: `artists` and `users()` are reproducible from the seed."""
+
+    def __init__(self, users, seed=42, artists=20000):
+        self.size = users
+        self.seed = seed
+        rnd = random.Random(seed)
+
+        with open(TAXONOMY_PATH, "r") as f:
+            taxonomy = {main.lower(): sorted({g.lower() for g in subs}) for main, subs in json.load(f).items()}
+        self.main_genres = list(taxonomy)
+        rnd.shuffle(self.main_genres)  # popularity order
+        self.main_weights = zipf_cum_weights(len(self.main_genres))
+        self.sub_genres = {}
+        for main in self.main_genres:
+            subs = taxonomy[main] or [main]
+            rnd.shuffle(subs)
+            self.sub_genres[main] = (subs, zipf_cum_weights(len(subs)))
+
+        # Artist pool: index = artist id - 1; per main genre, earlier artists are more popular
+        self.artists = []
+        self.artists_by_main = {main: [] for main in self.main_genres}
+        for n in range(artists):
+            main = rnd.choices(self.main_genres, cum_weights=self.main_weights)[0]
+            genres = self._artist_genres(rnd, main)
+            self.artists.append({"id": f"artist{n}", "name": f"Artist {n}", "genres": genres})
+            self.artists_by_main[main].append(n)
+        self.artist_weights = {main: zipf_cum_weights(len(ids), 0.8) for main, ids in self.artists_by_main.items()}
+        self.genres = sorted({g for artist in self.artists for g in artist["genres"]})
+
+    def _artist_genres(self, rnd, main):
+        subs, weights = self.sub_genres[main]
+        genres = rnd.choices(subs, cum_weights=weights, k=rnd.randint(1, 4))
+        if rnd.random() < 0.15:
+            other = rnd.choices(self.main_genres, cum_weights=self.main_weights)[0]
+            other_subs, other_weights = self.sub_genres[other]
+            genres.append(rnd.choices(other_subs, cum_weights=other_weights)[0])
+        if rnd.random() < SPELLING_VARIANTS:
+            genres[0] = rnd.choice([genres[0].title().replace(" ", "-"), f"nigerian {genres[0]}", f"{genres[0]} revival"])
+        return list(dict.fromkeys(genres))
+
+    def users(self):
+        """Yield (spotify_id, top artists, top genres, top tracks) for every user, in id order."""
+        rnd = random.Random(self.seed + 1)
+        for n in range(self.size):
+            favourites = rnd.choices(self.main_genres, cum_weights=self.main_weights, k=rnd.randint(1, 3))
+            picked = {}
+            while len(picked) < TOP_ARTISTS:
+                if rnd.random() < 0.85:
+                    main = rnd.choice(favourites)
+                    pool = self.artists_by_main[main]
+                    if not pool:
+                        continue
+                    artist_id = rnd.choices(pool, cum_weights=self.artist_weights[main])[0]
+                else:
+                    artist_id = rnd.randrange(len(self.artists))
+                picked[artist_id] = None
+            artists = [self.artists[a] for a in picked]
+            genres = list(dict.fromkeys(g for artist in artists for g in artist["genres"]))
+            tracks = {}
+            for a in rnd.choices(list(picked), k=TOP_TRACKS):
+                spotify_id = f"track{a}-{rnd.randrange(TRACKS_PER_ARTIST)}"
+                tracks.setdefault(spotify_id, {
+                    "id": spotify_id, "name": spotify_id.replace("track", "Track ", 1),
+                    "artists": [{"name": self.artists[a]["name"]}], "external_urls": {},
+                })
+            yield f"user{n}", artists, genres, list(tracks.values())
+
+    def user_ids(self):
+        return [f"user{n}" for n in range(self.size)]
+
+
+def seed_database(app, population, progress=None):
+    """
+    Bulk-load the population into the app's database (schema created here) with core inserts,
+    filling the same columns and taste tables `User.update_listening_data` would.
+    """
+    from backend.extensions import db
+    from backend.models import (
+        Artist, Genre, Track, User, UserArtist, UserGenre, UserTrack, artist_genres, canonical_json,
+    )
+    from backend.taste_features import compute_features, encode_features
+
+    with app.app_context():
+        db.create_all()
+        connection = db.session.connection()
+
+        genre_ids = {name: i for i, name in enumerate(population.genres, start=1)}
+        connection.execute(Genre.__table__.insert(), [{"id": i, "name": name} for name, i in genre_ids.items()])
+        connection.execute(Artist.__table__.insert(), [
+            {"id": n, "spotify_id": artist["id"], "name": artist["name"]} for n, artist in enumerate(population.artists, start=1)
+        ])
+        connection.execute(artist_genres.insert(), [
+            {"artist_id": n, "genre_id": genre_ids[g]}
+            for n, artist in enumerate(population.artists, start=1) for g in artist["genres"]
+        ])
+        connection.execute(Track.__table__.insert(), [
+            {"id": a * TRACKS_PER_ARTIST + k + 1, "spotify_id": f"track{a}-{k}", "name": f"Track {a}-{k}"}
+            for a in range(len(population.artists)) for k in range(TRACKS_PER_ARTIST)
+        ])
+        artist_ids = {artist["id"]: n for n, artist in enumerate(population.artists, start=1)}
+
+        now = datetime.utcnow()
+        users, artist_links, genre_links, track_links = [], [], [], []
+
+        def flush():
+            connection.execute(User.__table__.insert(), users)
+            connection.execute(UserArtist.__table__.insert(), artist_links)
+            connection.execute(UserGenre.__table__.insert(), genre_links)
+            connection.execute(UserTrack.__table__.insert(), track_links)
+            for rows in (users, artist_links, genre_links, track_links):
+                rows.clear()
+
+        for user_id, (spotify_id, artists, genres, tracks) in enumerate(population.users(), start=1):
+            features = encode_features(compute_features(artists, genres))
+            users.append({
+                "id": user_id, "spotify_id": spotify_id, "access_token": "token", "refresh_token": "refresh",
+                "expires_at": now + timedelta(hours=1), "synced_at": now,
+                "top_artists": canonical_json(artists), "top_genres": canonical_json(genres),
+                "top_tracks": canonical_json(tracks), "taste_features": features,
+                "taste_version": hashlib.blake2b(features, digest_size=8).hexdigest(), "taste_changed_at": now,
+            })
+            artist_links.extend(
+                {"user_id": user_id, "artist_id": artist_ids[a["id"]], "rank": rank} for rank, a in enumerate(artists)
+            )
+            genre_links.extend({"user_id": user_id, "genre_id": genre_ids[g], "rank": rank} for rank, g in enumerate(genres))
+            track_links.extend(
+                {"user_id": user_id, "track_id": _track_id(track["id"]), "rank": rank} for rank, track in enumerate(tracks)
+            )
+            if user_id % INSERT_BATCH == 0:
+                flush()
+                if progress:
+                    progress(user_id)
+        if users:
+            flush()
+        db.session.commit()
+
+
+def _track_id(spotify_id):
+    artist, k = spotify_id.removeprefix("track").split("-")
+    return int(artist) * TRACKS_PER_ARTIST + int(k) + 1
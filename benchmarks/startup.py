@@ -0,0 +1,132 @@
+"""
+Cold-start cost of the backend: what every gunicorn worker (without preload), CLI command and
+test process pays before serving.
+
+    python -m benchmarks.startup --runs 20 --output bench/startup-$(git rev-parse --short HEAD).json
+    python -m benchmarks.startup --runs 20 --compare bench/startup-base.json
+
+Each run is a fresh interpreter (bytecode already compiled, OS file cache warm) timing:
+
+  import_backend        `import backend` (Flask and Config; create_app imports the rest)
+  create_app_cold       first create_app(): importing extensions, models, blueprints + the factory
+  create_app_warm       a second create_app() in the same process, i.e. the factory alone
+  taxonomy_<source>     first map_to_main_genre, loading the taxonomy from the JSON or from the
+                        artifact `flask taxonomy build` writes
+  cold_start_<source>   import_backend + create_app_cold + taxonomy_<source>
+
+plus the peak RSS of the process. In-process, taxonomy_compile and taxonomy_artifact_read
+time loading the taxonomy either way once everything is imported. Results use the
+benchmarks.suite format, so --compare works the same way.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from benchmarks.load_test import ROOT
+from benchmarks.suite import compare, git_commit, measure, summarize
+
+# Runs in the child interpreter; prints its timings (seconds) and peak RSS as JSON
+CHILD = r"""
+import json, resource, time
+started = time.perf_counter()
+import backend
+imported = time.perf_counter()
+app = backend.create_app()
+created = time.perf_counter()
+backend.create_app()
+recreated = time.perf_counter()
+from backend.genre_taxonomy import map_to_main_genre
+mapping_started = time.perf_counter()
+map_to_main_genre("afrobeats")
+mapped = time.perf_counter()
+print(json.dumps({
+    "import_backend": imported - started,
+    "create_app_cold": created - imported,
+    "create_app_warm": recreated - created,
+    "taxonomy": mapped - mapping_started,
+    "cold_start": (imported - started) + (created - imported) + (mapped - mapping_started),
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def run_child(env):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(args):
+    scratch = tempfile.TemporaryDirectory()
+    artifact = os.path.join(scratch.name, "genre_taxonomy.marshal")
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "DATABASE_URL": f"sqlite:///{os.path.join(scratch.name, 'startup.db')}",
+        "TOKEN_REFRESH_INTERVAL": "0",
+    }
+    from backend.genre_taxonomy import TAXONOMY_PATH, compile_taxonomy, load_taxonomy, write_artifact
+
+    with open(TAXONOMY_PATH, "rb") as f:
+        raw = f.read()
+    write_artifact(compile_taxonomy(raw), artifact)
+
+    samples, rss = {}, {}
+    sources = {"json": os.path.join(scratch.name, "missing.marshal"), "artifact": artifact}
+    for n in range(args.runs):
+        for source, path in sources.items():  # Interleaved, so drift affects both alike
+            timings = run_child({**env, "TAXONOMY_ARTIFACT_PATH": path})
+            rss.setdefault(source, []).append(timings.pop("max_rss_kb"))
+            for name, seconds in timings.items():
+                if name in ("taxonomy", "cold_start"):
+                    name = f"{name}_{source}"
+                elif source != "json":
+                    continue  # The same with either source
+                samples.setdefault(name, []).append(seconds)
+        print(f"  run {n + 1}/{args.runs}", file=sys.stderr)
+
+    results = {name: summarize(values) for name, values in samples.items()}
+    results["taxonomy_compile"] = measure(lambda i: compile_taxonomy(raw), args.iterations)
+    results["taxonomy_artifact_read"] = measure(lambda i: load_taxonomy(artifact_path=artifact), args.iterations)
+    for name, result in results.items():
+        print(f"{name:<28} p50 {result['p50_us'] / 1000:>10.2f}ms  p95 {result['p95_us'] / 1000:>10.2f}ms")
+    peak_rss = {source: int(statistics.median(values)) for source, values in rss.items()}
+    print("peak RSS " + ", ".join(f"{source} {kb / 1024:.1f} MiB" for source, kb in peak_rss.items()))
+
+    scratch.cleanup()
+    report = {
+        "meta": {
+            **git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "runs": args.runs,
+            "max_rss_kb": peak_rss,
+        },
+        "results": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"results → {args.output}", file=sys.stderr)
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters per taxonomy source")
+    parser.add_argument("--iterations", type=int, default=200, help="In-process taxonomy loads timed")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="A previous --output file to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p50 slowdown that counts as a regression")
+    run(parser.parse_args())
@@ -0,0 +1,282 @@
+"""
+Reproducible benchmark suite over a synthetic user population.
+
+    python -m benchmarks.suite --users 100000 --output bench/$(git rev-parse --short HEAD).json
+    python -m benchmarks.suite --users 100000 --db /tmp/pop-100k.db --compare bench/base.json
+
+Seeds a scratch SQLite database with a synthetic population (see benchmarks/population.py),
+or reuses --db when it already holds one of the same size, then runs:
+
+  micro  genre mapping, feature computation and codec, merge_user_data, weighted similarity,
+         group comparison, JSON (de)serialization of snapshots and /compare-users payloads
+  db     user lookups by spotify_id, one and a pair through load_users; similarity matrix load
+  e2e    Flask test-client requests: /compare-users (binary and weighted, cold and cached,
+         revalidated with If-None-Match, gzipped), /top-artists, /matches and /callback against the local fake Spotify (no added latency)
+
+Every benchmark reports p50/p95/mean microseconds per operation and ops/s. --output writes
+them as JSON together with the commit, Python version and machine, and --compare diffs the
+run against such a file, exiting non-zero when a p50 regressed by more than --threshold.
+Concurrency under gunicorn is covered by benchmarks.load_test.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.fake_spotify import fake_spotify
+from benchmarks.load_test import ROOT
+from benchmarks.population import Population, seed_database
+
+SECTIONS = ("micro", "db", "e2e")
+
+
+def measure(fn, n, batch=1, warmup=None):
+    """Call fn(i) n times (after a few warm-up calls); timings are per item when each call does `batch` items."""
+    for i in range(warmup if warmup is not None else min(10, n)):
+        fn(i)
+    timings = []
+    for i in range(n):
+        started = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - started) / batch)
+    return summarize(timings, n * batch)
+
+
+def summarize(timings, n=None):
+    """p50/p95/mean microseconds and ops/s of per-operation timings in seconds."""
+    timings = sorted(timings)
+    mean = statistics.fmean(timings)
+    return {
+        "n": len(timings) if n is None else n,
+        "p50_us": round(statistics.median(timings) * 1e6, 3),
+        "p95_us": round(timings[max(0, int(len(timings) * 0.95) - 1)] * 1e6, 3),
+        "mean_us": round(mean * 1e6, 3),
+        "ops_per_s": round(1 / mean, 1) if mean else None,
+    }
+
+
+def run_micro(ctx):
+    from backend.genre_taxonomy import _fallback_main_genre, map_to_main_genre
+    from backend.models import User, canonical_json
+    from backend.serialization import dumps
+    from backend.taste_features import compute_features, decode_features, encode_features
+    from backend.user_comparison import (
+        group_comparison, load_taste_index, merge_user_data, safe_json_loads, weighted_similarity,
+    )
+
+    sample, rnd, n = ctx.sample, random.Random(5), ctx.iterations
+    genres = [g for _, _, user_genres, _ in sample for g in user_genres]
+    genres += [g.upper() for g in genres[: len(genres) // 10]]  # case variants hit the normalizer
+    rnd.shuffle(genres)
+    mapping_batch = 1000
+    _fallback_main_genre.cache_clear()
+
+    features = [compute_features(artists, user_genres) for _, artists, user_genres, _ in sample]
+    blobs = [encode_features(f) for f in features]
+    users = [User(spotify_id=spotify_id, taste_features=blob) for (spotify_id, *_), blob in zip(sample, blobs)]
+    pairs = [rnd.sample(users, 2) for _ in range(n)]
+    groups = [rnd.sample(users, min(10, len(users))) for _ in range(max(1, n // 10))]
+    payloads = [merge_user_data(a, b) for a, b in pairs[:100]]
+    snapshots = [canonical_json(artists) for _, artists, _, _ in sample]
+    load_taste_index()  # weighted scoring reads population IDF from the matrix
+
+    def at(items, i):
+        return items[i % len(items)]
+
+    return {
+        "genre_mapping": measure(
+            lambda i: [map_to_main_genre(at(genres, i * mapping_batch + k)) for k in range(mapping_batch)],
+            max(1, n // 10), batch=mapping_batch,
+        ),
+        "compute_features": measure(lambda i: compute_features(at(sample, i)[1], at(sample, i)[2]), n),
+        "encode_features": measure(lambda i: encode_features(at(features, i)), n),
+        "decode_features": measure(lambda i: decode_features(at(blobs, i)), n),
+        "merge_user_data": measure(lambda i: merge_user_data(*pairs[i]), n),
+        "weighted_similarity": measure(lambda i: weighted_similarity(*pairs[i]), n),
+        "group_comparison_10": measure(lambda i: group_comparison(at(groups, i)), len(groups)),
+        "serialize_compare_payload": measure(lambda i: dumps(at(payloads, i)), n),
+        "serialize_top_artists": measure(lambda i: canonical_json(at(sample, i)[1]), n),
+        "deserialize_top_artists": measure(lambda i: safe_json_loads(at(snapshots, i)), n),
+    }
+
+
+def run_db(ctx):
+    from backend.extensions import db
+    from backend.models import User
+    from backend.similarity_engine import taste_index
+    from backend.user_comparison import load_taste_index
+    from backend.user_loader import hot_users, load_users
+
+    ids, rnd, n, app = ctx.user_ids, random.Random(6), ctx.iterations, ctx.app
+    picks = [rnd.choice(ids) for _ in range(2 * n)]
+
+    def in_request(fn):
+        def one(i):
+            with app.test_request_context():
+                fn(i)
+                db.session.remove()
+        return one
+
+    results = {"lookup_by_spotify_id": measure(in_request(lambda i: User.query.filter_by(spotify_id=picks[i]).first()), n)}
+    maxsize, hot_users.maxsize = hot_users.maxsize, 0  # the query path, not the hot cache
+    results["load_users_pair"] = measure(in_request(lambda i: load_users(picks[2 * i:2 * i + 2])), n)
+    hot_users.maxsize = maxsize
+
+    def reload_matrix(i):
+        taste_index.loaded = False
+        load_taste_index()
+    results["taste_matrix_load"] = measure(reload_matrix, 1, warmup=0)
+    return results
+
+
+def run_e2e(ctx):
+    from backend.user_comparison import comparison_cache
+
+    client, ids, rnd, n = ctx.app.test_client(), ctx.user_ids, random.Random(7), ctx.iterations
+    pairs = [rnd.sample(ids, 2) for _ in range(n)]
+
+    def get(url, headers=None, **params):
+        response = client.get(url, query_string=params, headers=headers)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{url} {params} → {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    results = {}
+    maxsize, comparison_cache.maxsize = comparison_cache.maxsize, 0  # every pair computed
+    for scoring in ("binary", "weighted"):
+        cold = [rnd.sample(ids, 2) for _ in range(n)]  # fresh pairs, so the hot-user cache doesn't favour one mode
+        results[f"compare_users_{scoring}"] = measure(
+            lambda i: get("/compare-users", user1=cold[i][0], user2=cold[i][1], scoring=scoring), n
+        )
+    comparison_cache.maxsize = maxsize
+    results["compare_users_cached"] = measure(lambda i: get("/compare-users", user1=pairs[0][0], user2=pairs[0][1]), n)
+    etag = get("/compare-users", user1=pairs[0][0], user2=pairs[0][1]).headers["ETag"]
+    results["compare_users_not_modified"] = measure(
+        lambda i: get("/compare-users", headers={"If-None-Match": etag}, user1=pairs[0][0], user2=pairs[0][1]), n
+    )
+    results["compare_users_gzip"] = measure(
+        lambda i: get("/compare-users", headers={"Accept-Encoding": "gzip"}, user1=pairs[0][0], user2=pairs[0][1]), n
+    )
+    results["top_artists_snapshot"] = measure(lambda i: get("/top-artists", spotify_id=pairs[i][0]), n)
+    results["matches_exact"] = measure(lambda i: get("/matches", spotify_id=pairs[i][0], k=20), max(1, n // 10))
+    results["callback"] = measure(
+        lambda i: get("/callback", code=f"suite-{ctx.run_id}-{i}"), max(1, n // 10), warmup=0
+    )
+    return results
+
+
+def git_commit():
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    commit = git("rev-parse", "HEAD")
+    return {"commit": commit or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no")) if commit else None}
+
+
+def compare(results, baseline_path, threshold):
+    """Print p50 changes against a previous run; returns the names that got slower than threshold."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({(baseline['meta'].get('commit') or '?')[:10]}):")
+    regressions = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if not before or not before["p50_us"]:
+            continue
+        ratio = result["p50_us"] / before["p50_us"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:<36} {before['p50_us']:>12.3f} → {result['p50_us']:>12.3f} us  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def run(args):
+    scratch = tempfile.TemporaryDirectory()
+    path = args.db or os.path.join(scratch.name, "population.db")
+    with fake_spotify(latency=0) as server:
+        # Point the app at the scratch database and fake Spotify before anything reads Config
+        os.environ.update({
+            "DATABASE_URL": f"sqlite:///{os.path.abspath(path)}",
+            "SPOTIFY_TOKEN_URL": server.token_url,
+            "SPOTIFY_API_BASE_URL": server.api_base_url,
+            "TOKEN_REFRESH_INTERVAL": "0",
+        })
+        from backend import create_app
+        from backend.extensions import db
+        from backend.models import User
+        from backend.serialization import BACKEND as json_backend
+
+        app = create_app()
+        population = Population(args.users, seed=args.seed, artists=args.artists)
+        with app.app_context():
+            db.create_all()
+            existing = User.query.count()
+        if existing == 0:
+            started = time.perf_counter()
+            seed_database(app, population, progress=lambda done: print(f"  seeded {done}/{args.users}", file=sys.stderr))
+            seed_seconds = round(time.perf_counter() - started, 2)
+            print(f"seeded {args.users} users in {seed_seconds}s", file=sys.stderr)
+        elif existing >= args.users:
+            seed_seconds = None  # reused; /callback users from earlier runs are extra rows
+        else:
+            sys.exit(f"{path} holds {existing} users, fewer than --users {args.users}; remove it or lower --users")
+
+        ctx = argparse.Namespace(
+            app=app, iterations=args.iterations, run_id=int(time.time()),
+            sample=list(itertools.islice(population.users(), min(args.users, args.sample))),
+            user_ids=population.user_ids(),
+        )
+        results = {}
+        runners = {"micro": run_micro, "db": run_db, "e2e": run_e2e}
+        for section in args.sections:
+            with app.app_context():
+                for name, result in runners[section](ctx).items():
+                    results[f"{section}.{name}"] = result
+                    print(f"{section + '.' + name:<36} p50 {result['p50_us']:>12.3f}us  p95 {result['p95_us']:>12.3f}us  "
+                          f"{result['ops_per_s'] or 0:>12.1f}/s")
+
+    scratch.cleanup()
+    report = {
+        "meta": {
+            **git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "json_backend": json_backend,
+            "users": args.users, "artists": args.artists, "seed": args.seed,
+            "iterations": args.iterations, "seed_seconds": seed_seconds,
+        },
+        "results": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"results → {args.output}", file=sys.stderr)
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000, help="Population size (millions work; seeding takes a while)")
+    parser.add_argument("--artists", type=int, default=20000, help="Artist pool the population draws from")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=500, help="Timed calls per benchmark")
+    parser.add_argument("--sample", type=int, default=2000, help="Users held in memory for the micro benchmarks")
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--db", help="Keep the seeded database at this path and reuse it on later runs")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="A previous --output file to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p50 slowdown that counts as a regression")
+    run(parser.parse_args())
@@ -0,0 +1,108 @@
+"""
+User lookup latency on a large user table.
+
+    python -m benchmarks.user_lookup_benchmark --rows 1000000 --lookups 2000
+
+Fills a scratch SQLite database with ROWS minimal users, then times, per lookup:
+
+  full scan         SELECT ... FROM user NOT INDEXED WHERE spotify_id = ?   (what a missing index costs)
+  indexed first()   User.query.filter_by(spotify_id=...).first()
+  pair, 2 queries   two first() calls, as /compare-users used to do
+  pair, load_users  one IN query through the request-scoped loader
+  pair, hot cache   load_users when both users are in the cross-request LRU (no query)
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+INSERT_BATCH = 50000
+
+
+def timed(fn, repeat):
+    timings = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "p50_us": round(statistics.median(timings) * 1e6, 1),
+        "p95_us": round(timings[int(len(timings) * 0.95) - 1] * 1e6, 1),
+    }
+
+
+def fill(app, db, User, rows):
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    with app.app_context():
+        db.create_all()
+        for start in range(0, rows, INSERT_BATCH):
+            db.session.execute(User.__table__.insert(), [
+                {"spotify_id": f"user{n}", "access_token": "token", "expires_at": expires_at}
+                for n in range(start, min(start + INSERT_BATCH, rows))
+            ])
+        db.session.commit()
+
+
+def run(rows, lookups):
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "lookup.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+        from backend import create_app
+        from backend.extensions import db
+        from backend.models import User
+        from backend.user_loader import hot_users, load_users
+
+        app = create_app()
+        started = time.perf_counter()
+        fill(app, db, User, rows)
+        print(f"filled {rows} users in {time.perf_counter() - started:.1f}s")
+
+        rnd = random.Random(5)
+        ids = [f"user{rnd.randrange(rows)}" for _ in range(lookups * 2)]
+        results = {}
+
+        raw = sqlite3.connect(path)
+        scans = max(3, min(lookups, 20))  # a scan is slow; a handful is enough
+        results["full scan"] = timed(
+            lambda i: raw.execute('SELECT id FROM "user" NOT INDEXED WHERE spotify_id = ?', (ids[i],)).fetchone(),
+            scans,
+        )
+        raw.close()
+
+        def with_request(fn):
+            def one(i):
+                with app.test_request_context():
+                    fn(i)
+                    db.session.remove()
+            return one
+
+        results["indexed first()"] = timed(
+            with_request(lambda i: User.query.filter_by(spotify_id=ids[i]).first()), lookups
+        )
+        results["pair, 2 queries"] = timed(with_request(lambda i: (
+            User.query.filter_by(spotify_id=ids[2 * i]).first(),
+            User.query.filter_by(spotify_id=ids[2 * i + 1]).first(),
+        )), lookups)
+
+        hot_users.maxsize = 0  # measure the query path only
+        results["pair, load_users"] = timed(with_request(lambda i: load_users([ids[2 * i], ids[2 * i + 1]])), lookups)
+
+        hot_users.maxsize = lookups * 2
+        with_request(lambda i: load_users(ids))(0)  # warm the LRU
+        results["pair, hot cache"] = timed(with_request(lambda i: load_users([ids[2 * i], ids[2 * i + 1]])), lookups)
+
+    for name, result in results.items():
+        print(f"{name:<18} p50 {result['p50_us']:>10.1f}us   p95 {result['p95_us']:>10.1f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.rows, args.lookups)
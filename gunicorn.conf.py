@@ -0,0 +1,46 @@
+"""
+Gunicorn settings for the Spot A Friend backend.
+
+    gunicorn -c gunicorn.conf.py backend.wsgi:app
+
+The same app with the /async Spotify routes on an event loop (see backend/asgi.py):
+    gunicorn -c gunicorn.conf.py -k asgi backend.asgi:app
+
+Every knob can be overridden through the environment (see each setting), e.g.
+    WEB_CONCURRENCY=4 GUNICORN_THREADS=8 gunicorn -c gunicorn.conf.py backend.wsgi:app
+
+Graceful reload: `kill -HUP <master pid>` starts new workers with fresh code/config and
+lets old ones finish in-flight requests (up to graceful_timeout).
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:5000")
+
+# Workers are processes; threads let one worker overlap requests blocked on Spotify.
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS") or ("gthread" if threads > 1 else "sync")  # "asgi" for backend.asgi:app
+
+# Import the app (taxonomy, models) once in the master and fork workers from it.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# Recycle workers periodically to cap memory growth; jitter avoids restarting all at once.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 500))
+
+reload = os.environ.get("GUNICORN_RELOAD", "false").lower() == "true"  # Development only
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-") or None  # Empty string disables access logs
+
+
+def post_fork(server, worker):
+    """Database connections opened in the master must not be shared with forked workers."""
+    from backend.extensions import db
+    from backend.wsgi import app
+
+    with app.app_context():
+        db.engine.dispose(close=False)
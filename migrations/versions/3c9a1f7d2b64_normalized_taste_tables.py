@@ -0,0 +1,130 @@
+"""Normalized taste tables (artist, genre, track and user associations)
+
+Revision ID: 3c9a1f7d2b64
+Revises: a745633896da
+Create Date: 2026-10-17 10:12:41.118204
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9a1f7d2b64'
+down_revision = 'a745633896da'
+branch_labels = None
+depends_on = None
+
+
+def _loads(data):
+    if not data:
+        return []
+    try:
+        return json.loads(data)
+    except json.JSONDecodeError:
+        return []
+
+
+def upgrade():
+    op.create_table('genre',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_genre_name'), 'genre', ['name'], unique=True)
+
+    op.create_table('artist',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_artist_name'), 'artist', ['name'], unique=True)
+
+    op.create_table('track',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=300), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_track_name'), 'track', ['name'], unique=True)
+
+    op.create_table('artist_genre',
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ),
+        sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ),
+        sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index(op.f('ix_artist_genre_genre_id'), 'artist_genre', ['genre_id'], unique=False)
+
+    for name, target in (('artist', 'artist'), ('genre', 'genre'), ('track', 'track')):
+        op.create_table(f'user_{name}',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column(f'{name}_id', sa.Integer(), nullable=False),
+            sa.Column('rank', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint([f'{name}_id'], [f'{target}.id'], ),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('user_id', f'{name}_id')
+        )
+        op.create_index(op.f(f'ix_user_{name}_{name}_id'), f'user_{name}', [f'{name}_id'], unique=False)
+
+    _backfill()
+
+
+def _backfill():
+    """Copy every user's JSON top_artists/top_genres/top_tracks into the new tables."""
+    bind = op.get_bind()
+    user = sa.table('user', sa.column('id'), sa.column('top_artists'), sa.column('top_tracks'), sa.column('top_genres'))
+    lookups = {
+        name: sa.table(name, sa.column('id'), sa.column('name'))
+        for name in ('artist', 'genre', 'track')
+    }
+    links = {
+        name: sa.table(f'user_{name}', sa.column('user_id'), sa.column(f'{name}_id'), sa.column('rank'))
+        for name in ('artist', 'genre', 'track')
+    }
+    artist_genre = sa.table('artist_genre', sa.column('artist_id'), sa.column('genre_id'))
+    ids = {name: {} for name in lookups}
+
+    def id_for(kind, name):
+        if name not in ids[kind]:
+            table = lookups[kind]
+            bind.execute(table.insert().values(name=name))
+            ids[kind][name] = bind.execute(sa.select(table.c.id).where(table.c.name == name)).scalar_one()
+        return ids[kind][name]
+
+    artist_genres_done = set()
+    for row in bind.execute(sa.select(user)).fetchall():
+        artists = [a for a in _loads(row.top_artists) if isinstance(a, dict) and a.get('name')]
+        genres = list(dict.fromkeys(_loads(row.top_genres)))
+        tracks = list(dict.fromkeys(t for t in _loads(row.top_tracks) if isinstance(t, str)))
+
+        for artist in artists:
+            artist_id = id_for('artist', artist['name'])
+            if artist_id not in artist_genres_done:
+                artist_genres_done.add(artist_id)
+                for genre in dict.fromkeys(artist.get('genres', [])):
+                    bind.execute(artist_genre.insert().values(artist_id=artist_id, genre_id=id_for('genre', genre)))
+
+        for kind, names in (('artist', dict.fromkeys(a['name'] for a in artists)), ('genre', genres), ('track', tracks)):
+            rows = [
+                {'user_id': row.id, f'{kind}_id': id_for(kind, name), 'rank': rank}
+                for rank, name in enumerate(names)
+            ]
+            if rows:
+                bind.execute(links[kind].insert(), rows)
+
+
+def downgrade():
+    for name in ('track', 'genre', 'artist'):
+        op.drop_index(op.f(f'ix_user_{name}_{name}_id'), table_name=f'user_{name}')
+        op.drop_table(f'user_{name}')
+    op.drop_index(op.f('ix_artist_genre_genre_id'), table_name='artist_genre')
+    op.drop_table('artist_genre')
+    op.drop_index(op.f('ix_track_name'), table_name='track')
+    op.drop_table('track')
+    op.drop_index(op.f('ix_artist_name'), table_name='artist')
+    op.drop_table('artist')
+    op.drop_index(op.f('ix_genre_name'), table_name='genre')
+    op.drop_table('genre')
@@ -0,0 +1,39 @@
+"""Unique index on user.spotify_id
+
+Revision ID: c5f81e2a7d39
+Revises: e41c8a6f9d02
+Create Date: 2026-10-17 20:41:12.508316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f81e2a7d39'
+down_revision = 'e41c8a6f9d02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Replace the unique constraint (uq_user_spotify_id, or the backend's default name on databases
+    # created with `flask init-db`) with the named unique index the model declares.
+    inspector = sa.inspect(op.get_bind())
+    constraints = [
+        c['name'] for c in inspector.get_unique_constraints('user')
+        if c['column_names'] == ['spotify_id'] and c['name']
+    ]
+    indexes = {i['name'] for i in inspector.get_indexes('user')}
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        for name in constraints:
+            batch_op.drop_constraint(name, type_='unique')
+        if 'ix_user_spotify_id' not in indexes:
+            batch_op.create_index(batch_op.f('ix_user_spotify_id'), ['spotify_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_spotify_id'))
+        batch_op.create_unique_constraint('uq_user_spotify_id', ['spotify_id'])
@@ -0,0 +1,44 @@
+"""Store top tracks as track records
+
+Revision ID: d3b8f0a6c2e4
+Revises: 9a4d2c7e1f60
+Create Date: 2026-10-18 10:05:31.642180
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3b8f0a6c2e4'
+down_revision = '9a4d2c7e1f60'
+branch_labels = None
+depends_on = None
+
+user = sa.table('user', sa.column('id', sa.Integer), sa.column('top_tracks', sa.Text))
+
+
+def _rewrite(convert):
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(user.c.id, user.c.top_tracks).where(user.c.top_tracks.isnot(None))).all()
+    for user_id, top_tracks in rows:
+        tracks = convert(json.loads(top_tracks))
+        if tracks is not None:
+            connection.execute(
+                user.update().where(user.c.id == user_id)
+                .values(top_tracks=json.dumps(tracks, sort_keys=True, separators=(',', ':'), ensure_ascii=False))
+            )
+
+
+def upgrade():
+    # Snapshots stored track names only; the next sync fills in artists and links
+    _rewrite(lambda tracks: [
+        {'name': track, 'artists': [], 'external_urls': {}} if isinstance(track, str) else track
+        for track in tracks
+    ])
+
+
+def downgrade():
+    _rewrite(lambda tracks: [track['name'] if isinstance(track, dict) else track for track in tracks])